@@ -0,0 +1,38 @@
+"""Static assets with content-versioned URLs."""
+import hashlib
+import os
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+from fastapi.staticfiles import StaticFiles
+from starlette.responses import Response
+from starlette.types import Scope
+
+STATIC_DIRECTORY = "static"
+
+
+@lru_cache(maxsize=256)
+def file_version(full_path: str, mtime_ns: int, size: int) -> str:
+    """Hash of a file's content, cached per modification time and size."""
+    with open(full_path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles that lets browsers cache URLs versioned with the file's current hash forever."""
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        # Only the current version is immutable: ?dev=1 or a stale ?v= must not pin an old response
+        versions = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("v")
+        if versions and versions == [file_version(str(full_path), stat_result.st_mtime_ns, stat_result.st_size)]:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+@lru_cache
+def static_url(path: str) -> str:
+    """Get the URL of a static file, versioned by a hash of its content."""
+    full_path = os.path.join(STATIC_DIRECTORY, path)
+    stat_result = os.stat(full_path)
+    return f"/static/{path}?v={file_version(full_path, stat_result.st_mtime_ns, stat_result.st_size)}"
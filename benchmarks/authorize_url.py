@@ -0,0 +1,63 @@
+"""Per-request cost of building the authorize redirect URL.
+
+Compares the library's ``get_authorization_url``, which urlencodes every
+parameter on each call, with the precompiled URL, with and without
+generating a PKCE pair, for every provider::
+
+    python -m benchmarks.authorize_url --iterations 100000
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import time
+from typing import Awaitable, Callable
+
+from benchmarks.startup import PROVIDER_PREFIXES, scenario_environment
+
+
+async def per_call(call: Callable[[], Awaitable[object]], iterations: int) -> float:
+    """Mean seconds per awaited call."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await call()
+    return (time.perf_counter() - started) / iterations
+
+
+async def run(iterations: int) -> None:
+    # Imported here, once every provider is configured
+    from clients.authorize import compile_authorize_url, pkce_pair
+    from clients.registry import PROVIDERS, provider_clients
+
+    state = secrets.token_urlsafe(24)
+    print(f"{'provider':<12} {'library us':>11} {'compiled us':>12} {'+ pkce us':>10} {'speedup':>8}")
+    for name, client in provider_clients.items():
+        redirect_uri = PROVIDERS[name].redirect_uri
+        authorize_url = await compile_authorize_url(name, client)
+
+        async def library() -> str:
+            return await client.get_authorization_url(redirect_uri=redirect_uri, state=state)
+
+        async def compiled() -> str:
+            return authorize_url.build(state)
+
+        async def compiled_pkce() -> str:
+            return authorize_url.build(state, pkce_pair()[1])
+
+        before = await per_call(library, iterations)
+        after = await per_call(compiled, iterations)
+        pkce = await per_call(compiled_pkce, iterations)
+        print(f"{name:<12} {before * 1e6:>11.2f} {after * 1e6:>12.2f} {pkce * 1e6:>10.2f} {before / after:>7.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Authorize URL microbenchmark")
+    parser.add_argument("--iterations", type=int, default=100000, help="calls per provider and variant")
+    args = parser.parse_args()
+
+    os.environ.update(scenario_environment(PROVIDER_PREFIXES))
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
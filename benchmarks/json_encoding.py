@@ -0,0 +1,86 @@
+"""Stdlib ``json`` vs the fast JSON backend on realistic user profiles.
+
+Encodes the mock provider's userinfo payloads the way the app does: as the
+``/api/user`` response body, as a session write and read, and through the
+``tojson`` filter of the home page, both normalized and with the raw
+provider payload kept (``USER_PROFILE_KEEP_RAW``)::
+
+    python -m benchmarks.json_encoding --iterations 20000
+"""
+import argparse
+import dataclasses
+import json
+import secrets
+import time
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+from jinja2 import Environment
+
+import fastjson
+from benchmarks.mock_provider import USERINFO
+from clients.profile import to_profile
+
+
+def per_call(call: Callable[[Any], Any], payloads: list[Any], iterations: int) -> float:
+    """Mean seconds per call, cycling through the payloads."""
+    rounds = max(1, iterations // len(payloads))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for payload in payloads:
+            call(payload)
+    return (time.perf_counter() - started) / (rounds * len(payloads))
+
+
+def operations() -> dict[str, tuple[Callable[[Any], Any], Callable[[Any], Any]]]:
+    """Operation name -> (stdlib call, fast backend call), each taking a profile."""
+    response = JSONResponse(content=None)
+    fast_response = fastjson.FastJSONResponse(content=None)
+    template = "<pre>{{ user.to_dict() | tojson(indent=2) }}</pre>"
+    stdlib_template = Environment().from_string(template)
+    fast_env = Environment()
+    fast_env.policies["json.dumps_function"] = fastjson.dumps_str
+    fast_template = fast_env.from_string(template)
+    grant = secrets.token_urlsafe(24)
+
+    def session(profile: Any) -> dict[str, Any]:
+        return {"user": profile.to_session(), "grant": grant}
+
+    return {
+        "/api/user body": (
+            lambda profile: response.render(profile.to_dict()),
+            lambda profile: fast_response.render(profile.to_dict()),
+        ),
+        "session write+read": (
+            lambda profile: json.loads(json.dumps(session(profile))),
+            lambda profile: fastjson.loads(fastjson.dumps(session(profile))),
+        ),
+        "tojson filter": (
+            lambda profile: stdlib_template.render(user=profile),
+            lambda profile: fast_template.render(user=profile),
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JSON encoding benchmark")
+    parser.add_argument("--iterations", type=int, default=20000, help="calls per operation and backend")
+    args = parser.parse_args()
+
+    profiles = [to_profile(provider, payload) for provider, payload in USERINFO.items()]
+    variants = {
+        "normalized": [dataclasses.replace(profile, raw=None) for profile in profiles],
+        "with raw": [dataclasses.replace(profile, raw=USERINFO[profile.provider]) for profile in profiles],
+    }
+
+    print(f"fast backend: {fastjson.BACKEND}")
+    print(f"{'operation':<20} {'profiles':<11} {'stdlib us':>10} {'fast us':>9} {'speedup':>8}")
+    for name, (stdlib_call, fast_call) in operations().items():
+        for variant, payloads in variants.items():
+            before = per_call(stdlib_call, payloads, args.iterations)
+            after = per_call(fast_call, payloads, args.iterations)
+            print(f"{name:<20} {variant:<11} {before * 1e6:>10.2f} {after * 1e6:>9.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
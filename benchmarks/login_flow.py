@@ -0,0 +1,163 @@
+"""End-to-end login benchmark against the local mock provider.
+
+Drives full ``/authorize`` -> provider -> ``/callback`` -> ``/api/user`` flows
+through the app in-process, at a fixed concurrency, and reports throughput and
+latency percentiles per provider::
+
+    python -m benchmarks.login_flow --concurrency 50 --requests 1000 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import httpx
+
+from benchmarks.mock_provider import MockProviderServer, create_mock_provider
+
+PROVIDER_PREFIXES = ("GITHUB", "GOOGLE", "FEISHU", "GITEE", "LINUXDO", "OSCHINA", "WECHAT_MP", "WECHAT_OPEN")
+
+
+@dataclass
+class Result:
+    """Latencies and failures of one provider's run."""
+
+    provider: str
+    elapsed: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def report(self) -> str:
+        rps = len(self.latencies) / self.elapsed if self.elapsed else 0.0
+        return (
+            f"{self.provider:<12} {rps:>9.1f} {self.percentile(50) * 1000:>9.2f} "
+            f"{self.percentile(95) * 1000:>9.2f} {self.percentile(99) * 1000:>9.2f} {self.errors:>7}"
+        )
+
+
+def configure_environment(mock_url: str) -> None:
+    """Point the app at the mock provider; must run before importing the app."""
+    os.environ["OAUTH_MOCK_PROVIDER_URL"] = mock_url
+    # Every flow comes from the same client IP
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    for prefix in PROVIDER_PREFIXES:
+        os.environ.setdefault(f"{prefix}_CLIENT_ID", f"bench-{prefix.lower()}")
+        os.environ.setdefault(f"{prefix}_CLIENT_SECRET", "bench-secret")
+
+
+async def login(app_client: httpx.AsyncClient, provider_client: httpx.AsyncClient, slug: str) -> None:
+    """Run one full login flow, raising on any unexpected response."""
+    response = await app_client.get(f"/api/v1/oauth2/{slug}/authorize")
+    authorize_url = response.headers.get("location", "")
+    if not authorize_url.startswith("http"):
+        raise RuntimeError(f"authorize failed: {response.status_code} {authorize_url}")
+
+    response = await provider_client.get(authorize_url)
+    callback = urlsplit(response.headers["location"])
+
+    response = await app_client.get(f"{callback.path}?{callback.query}")
+    if response.headers.get("location") != "/":
+        raise RuntimeError(f"callback failed: {response.status_code} {response.headers.get('location')}")
+
+    response = await app_client.get("/api/user")
+    if response.status_code != 200:
+        raise RuntimeError(f"user failed: {response.status_code}")
+
+
+async def run_provider(
+    app_transport: httpx.AsyncBaseTransport,
+    app_url: str,
+    provider_client: httpx.AsyncClient,
+    slug: str,
+    *,
+    requests: int,
+    concurrency: int,
+) -> Result:
+    """Run ``requests`` login flows for one provider at the given concurrency."""
+    result = Result(provider=slug)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            # Each flow gets its own cookie jar, like a separate browser
+            async with httpx.AsyncClient(transport=app_transport, base_url=app_url) as app_client:
+                started = time.perf_counter()
+                try:
+                    await login(app_client, provider_client, slug)
+                except Exception:
+                    result.errors += 1
+                else:
+                    result.latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def run(args: argparse.Namespace, mock_url: str) -> list[Result]:
+    configure_environment(mock_url)
+
+    import main
+    from clients import PROVIDERS
+
+    providers = args.providers or [name for name, provider in PROVIDERS.items() if provider.enabled]
+    app_transport = httpx.ASGITransport(app=main.app)
+    results = []
+    async with main.lifespan(main.app), httpx.AsyncClient(timeout=30) as provider_client:
+        for name in providers:
+            slug = PROVIDERS[name].slug
+            # Warm-up pass so connection setup does not skew the numbers
+            await run_provider(app_transport, "http://testserver", provider_client, slug, requests=10, concurrency=10)
+            results.append(
+                await run_provider(
+                    app_transport,
+                    "http://testserver",
+                    provider_client,
+                    slug,
+                    requests=args.requests,
+                    concurrency=args.concurrency,
+                )
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end OAuth login benchmark")
+    parser.add_argument("--providers", nargs="*", help="provider keys to run, default all enabled")
+    parser.add_argument("--requests", type=int, default=500, help="login flows per provider")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="mock upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-url", help="use an already running mock provider instead of starting one")
+    args = parser.parse_args()
+
+    server = None
+    mock_url = args.mock_url
+    if mock_url is None:
+        mock = create_mock_provider(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+        server = MockProviderServer(mock).start()
+        mock_url = server.url
+
+    try:
+        results = asyncio.run(run(args, mock_url))
+    finally:
+        if server is not None:
+            server.stop()
+
+    print(f"{'provider':<12} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for result in results:
+        print(result.report())
+
+
+if __name__ == "__main__":
+    main()
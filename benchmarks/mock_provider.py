@@ -0,0 +1,383 @@
+"""Local mock OAuth 2.0 provider.
+
+Serves ``/{provider}/authorize``, ``/{provider}/token``, ``/{provider}/userinfo``
+and ``/{provider}/revoke`` for every provider in the registry, with configurable
+latency and error injection. OpenID Connect providers also get discovery
+metadata, a JWKS and signed ``id_token``s when ``cryptography`` is installed. Start the app with
+``OAUTH_MOCK_PROVIDER_URL=http://127.0.0.1:9000`` to send all provider traffic here.
+
+Run standalone::
+
+    python -m benchmarks.mock_provider --port 9000 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import secrets
+import threading
+import time
+from urllib.parse import urlencode
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+
+try:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+except ImportError:
+    rsa = None
+
+# Realistically shaped userinfo payloads per provider
+USERINFO: dict[str, dict] = {
+    "github": {
+        "login": "octocat",
+        "id": 583231,
+        "node_id": "MDQ6VXNlcjU4MzIzMQ==",
+        "avatar_url": "https://avatars.githubusercontent.com/u/583231?v=4",
+        "html_url": "https://github.com/octocat",
+        "type": "User",
+        "site_admin": False,
+        "name": "The Octocat",
+        "company": "@github",
+        "blog": "https://github.blog",
+        "location": "San Francisco",
+        "email": None,
+        "bio": None,
+        "public_repos": 8,
+        "followers": 16000,
+        "following": 9,
+        "created_at": "2011-01-25T18:44:36Z",
+        "updated_at": "2024-01-22T12:13:38Z",
+    },
+    "google": {
+        "id": "108234567890123456789",
+        "email": "octocat@gmail.com",
+        "verified_email": True,
+        "name": "Octo Cat",
+        "given_name": "Octo",
+        "family_name": "Cat",
+        "picture": "https://lh3.googleusercontent.com/a/default-user",
+        "locale": "en",
+    },
+    "feishu": {
+        "sub": "ou_7d8a6e6df7621556ce0d21922b676706",
+        "name": "张三",
+        "picture": "https://s1-imfile.feishucdn.com/static-resource/v1/avatar",
+        "open_id": "ou_7d8a6e6df7621556ce0d21922b676706",
+        "union_id": "on_52bdbb6f4b9e9a4c1f6f0e8d2b3a7c6e",
+        "en_name": "Zhang San",
+        "tenant_key": "736588c92lxf175d",
+        "avatar_url": "https://s1-imfile.feishucdn.com/static-resource/v1/avatar",
+        "email": "zhangsan@example.com",
+        "user_id": "5d9bdxxx",
+        "employee_no": "111222333",
+        "mobile": "+86130xxxx",
+    },
+    "gitee": {
+        "id": 1234567,
+        "login": "octocat",
+        "name": "Octo Cat",
+        "avatar_url": "https://foruda.gitee.com/avatar/octocat.png",
+        "url": "https://gitee.com/api/v5/users/octocat",
+        "html_url": "https://gitee.com/octocat",
+        "bio": "",
+        "blog": "",
+        "public_repos": 12,
+        "followers": 3,
+        "following": 1,
+        "created_at": "2019-01-01T00:00:00+08:00",
+        "email": "octocat@example.com",
+    },
+    "linuxdo": {
+        "id": 12345,
+        "sub": "12345",
+        "username": "octocat",
+        "login": "octocat",
+        "name": "Octo Cat",
+        "email": "u12345@linux.do",
+        "avatar_template": "/user_avatar/linux.do/octocat/{size}/1_2.png",
+        "active": True,
+        "trust_level": 2,
+        "silenced": False,
+    },
+    "oschina": {
+        "id": 1234567,
+        "email": "octocat@example.com",
+        "name": "octocat",
+        "gender": "male",
+        "avatar": "https://static.oschina.net/uploads/user/octocat.png",
+        "location": "Shenzhen",
+        "url": "https://my.oschina.net/octocat",
+    },
+    "wechat_mp": {
+        "openid": "oLVPpjqs9BhvzwPj5A-vTYAX3GLc",
+        "nickname": "微信用户",
+        "sex": 0,
+        "province": "",
+        "city": "",
+        "country": "",
+        "headimgurl": "https://thirdwx.qlogo.cn/mmopen/vi_32/default/132",
+        "privilege": [],
+        "unionid": "o6_bmasdasdsad6_2sgVt7hMZOPfL",
+    },
+    "wechat_open": {
+        "openid": "oLVPpjqs9BhvzwPj5A-vTYAX3GLd",
+        "nickname": "微信用户",
+        "sex": 0,
+        "province": "",
+        "city": "",
+        "country": "",
+        "headimgurl": "https://thirdwx.qlogo.cn/mmopen/vi_32/default/132",
+        "privilege": [],
+        "unionid": "o6_bmasdasdsad6_2sgVt7hMZOPfL",
+    },
+}
+
+GITHUB_EMAILS = [
+    {"email": "octocat@github.com", "primary": True, "verified": True, "visibility": "private"},
+    {"email": "octocat@users.noreply.github.com", "primary": False, "verified": True, "visibility": None},
+]
+
+
+# Providers that issue ID tokens, with their userinfo key for each claim
+OIDC_CLAIMS: dict[str, dict[str, str]] = {
+    "google": {
+        "sub": "id",
+        "email": "email",
+        "email_verified": "verified_email",
+        "name": "name",
+        "given_name": "given_name",
+        "family_name": "family_name",
+        "picture": "picture",
+        "locale": "locale",
+    },
+}
+
+
+def b64url(data: bytes) -> str:
+    """Unpadded base64url, as used in JWTs."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def s256(verifier: str) -> str:
+    """PKCE S256 challenge of a code verifier."""
+    return b64url(hashlib.sha256(verifier.encode()).digest())
+
+
+def public_jwk(key: "rsa.RSAPrivateKey", kid: str) -> dict[str, str]:
+    """JWK of an RSA key's public half."""
+    numbers = key.public_key().public_numbers()
+    return {
+        "kty": "RSA",
+        "kid": kid,
+        "use": "sig",
+        "alg": "RS256",
+        "n": b64url(numbers.n.to_bytes((numbers.n.bit_length() + 7) // 8, "big")),
+        "e": b64url(numbers.e.to_bytes((numbers.e.bit_length() + 7) // 8, "big")),
+    }
+
+
+def sign_jwt(key: "rsa.RSAPrivateKey", kid: str, claims: dict) -> str:
+    """An RS256 JWT with the given claims."""
+    header = b64url(json.dumps({"alg": "RS256", "typ": "JWT", "kid": kid}).encode())
+    payload = b64url(json.dumps(claims).encode())
+    signature = key.sign(f"{header}.{payload}".encode(), padding.PKCS1v15(), hashes.SHA256())
+    return f"{header}.{payload}.{b64url(signature)}"
+
+
+def create_mock_provider(
+    *,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    single_use_codes: bool = True,
+) -> FastAPI:
+    """Create the mock provider app.
+
+    :param latency: Mean delay in seconds added to token, userinfo and revoke calls.
+    :param jitter: Uniform +/- jitter in seconds around ``latency``.
+    :param error_rate: Probability that a token, userinfo or revoke call returns 503.
+    :param single_use_codes: Reject a second exchange of the same code, like real providers.
+    """
+    app = FastAPI(title="Mock OAuth Provider", docs_url=None, redoc_url=None, openapi_url=None)
+    codes: dict[str, str] = {}
+    # PKCE challenges by code, checked against the verifier at the token exchange
+    challenges: dict[str, str] = {}
+    tokens: dict[str, str] = {}
+    signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048) if rsa is not None else None
+    kid = secrets.token_hex(8)
+
+    async def simulate() -> JSONResponse | None:
+        delay = latency + random.uniform(-jitter, jitter) if jitter else latency
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if error_rate and random.random() < error_rate:
+            return JSONResponse(status_code=503, content={"error": "temporarily_unavailable"})
+        return None
+
+    def issuer_of(request: Request, provider: str) -> str:
+        return f"{str(request.base_url).rstrip('/')}/{provider}"
+
+    def client_id_of(request: Request, params: dict[str, str]) -> str:
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("basic "):
+            return base64.b64decode(authorization[6:]).decode().partition(":")[0]
+        return params.get("client_id", "")
+
+    def access_token_of(request: Request) -> str | None:
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            return authorization[7:]
+        return request.query_params.get("access_token")
+
+    @app.get("/{provider}/authorize")
+    async def authorize(provider: str, redirect_uri: str, state: str | None = None, code_challenge: str | None = None):
+        code = secrets.token_urlsafe(16)
+        codes[code] = provider
+        if code_challenge is not None:
+            challenges[code] = code_challenge
+        params = {"code": code}
+        if state is not None:
+            params["state"] = state
+        return RedirectResponse(url=f"{redirect_uri}?{urlencode(params)}", status_code=302)
+
+    @app.api_route("/{provider}/token", methods=["GET", "POST"])
+    async def token(request: Request, provider: str):
+        if failure := await simulate():
+            return failure
+        params = dict(request.query_params)
+        if request.method == "POST":
+            params.update((await request.form()).items())
+
+        if params.get("grant_type") == "refresh_token":
+            if not params.get("refresh_token"):
+                return JSONResponse(status_code=400, content={"error": "invalid_grant"})
+        else:
+            code = params.get("code", "")
+            issued = codes.pop(code, None) if single_use_codes else codes.get(code)
+            if issued != provider:
+                return JSONResponse(status_code=400, content={"error": "invalid_grant"})
+            challenge = challenges.pop(code, None) if single_use_codes else challenges.get(code)
+            if challenge is not None and challenge != s256(params.get("code_verifier", "")):
+                return JSONResponse(status_code=400, content={"error": "invalid_grant"})
+
+        access_token = secrets.token_urlsafe(24)
+        tokens[access_token] = provider
+        data = {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "expires_in": 7200,
+            "refresh_token": secrets.token_urlsafe(24),
+            "scope": "user",
+        }
+        if provider.startswith("wechat"):
+            data["openid"] = USERINFO[provider]["openid"]
+            data["unionid"] = USERINFO[provider]["unionid"]
+        if provider in OIDC_CLAIMS and signing_key is not None:
+            now = int(time.time())
+            claims = {claim: USERINFO[provider][key] for claim, key in OIDC_CLAIMS[provider].items()}
+            claims.update(
+                iss=issuer_of(request, provider),
+                aud=client_id_of(request, params),
+                iat=now,
+                exp=now + 3600,
+            )
+            data["id_token"] = sign_jwt(signing_key, kid, claims)
+        return data
+
+    @app.get("/{provider}/.well-known/openid-configuration")
+    async def openid_configuration(request: Request, provider: str):
+        if provider not in OIDC_CLAIMS or signing_key is None:
+            return JSONResponse(status_code=404, content={"error": "not_found"})
+        issuer = issuer_of(request, provider)
+        return {
+            "issuer": issuer,
+            "authorization_endpoint": f"{issuer}/authorize",
+            "token_endpoint": f"{issuer}/token",
+            "userinfo_endpoint": f"{issuer}/userinfo",
+            "revocation_endpoint": f"{issuer}/revoke",
+            "jwks_uri": f"{issuer}/jwks",
+            "id_token_signing_alg_values_supported": ["RS256"],
+        }
+
+    @app.get("/{provider}/jwks")
+    async def jwks(provider: str):
+        if provider not in OIDC_CLAIMS or signing_key is None:
+            return JSONResponse(status_code=404, content={"error": "not_found"})
+        return JSONResponse({"keys": [public_jwk(signing_key, kid)]}, headers={"Cache-Control": "max-age=3600"})
+
+    @app.get("/{provider}/userinfo")
+    async def userinfo(request: Request, provider: str):
+        if failure := await simulate():
+            return failure
+        if tokens.get(access_token_of(request) or "") != provider:
+            return JSONResponse(status_code=401, content={"error": "invalid_token"})
+        return USERINFO[provider]
+
+    @app.get("/{provider}/userinfo/emails")
+    async def userinfo_emails(request: Request, provider: str):
+        if failure := await simulate():
+            return failure
+        if tokens.get(access_token_of(request) or "") != provider:
+            return JSONResponse(status_code=401, content={"error": "invalid_token"})
+        return GITHUB_EMAILS
+
+    # POST with a form is RFC 7009, DELETE with JSON is GitHub's applications API
+    @app.api_route("/{provider}/revoke", methods=["POST", "DELETE"])
+    async def revoke(request: Request, provider: str):
+        if failure := await simulate():
+            return failure
+        if request.method == "DELETE":
+            token = (await request.json()).get("access_token", "")
+        else:
+            token = (await request.form()).get("token", "")
+        tokens.pop(token, None)
+        return {}
+
+    return app
+
+
+class MockProviderServer:
+    """Run the mock provider on a local port in a background thread."""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 0):
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockProviderServer":
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Mock provider failed to start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock OAuth 2.0 provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 503 per call")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_mock_provider(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
@@ -0,0 +1,155 @@
+"""Single-worker vs multi-worker throughput of ``server.py``.
+
+Starts the mock provider and the real server as subprocesses, with the
+state, session and token stores on SQLite so logins work across workers,
+then drives full login flows over HTTP from several client processes::
+
+    python -m benchmarks.server --workers 1 4 --requests 2000 --concurrency 100 --latency 0.02
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.login_flow import PROVIDER_PREFIXES, Result, login
+from benchmarks.startup import free_port
+
+
+class SharedTransport(httpx.AsyncHTTPTransport):
+    """Connection pool shared by many short-lived clients, closed explicitly at the end."""
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{url} did not start in time")
+
+
+def server_environment(mock_url: str, port: int, workers: int, directory: str) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        OAUTH_MOCK_PROVIDER_URL=mock_url,
+        SERVER_HOST="127.0.0.1",
+        SERVER_PORT=str(port),
+        SERVER_WORKERS=str(workers),
+        OAUTH_STATE_BACKEND="sqlite",
+        OAUTH_STATE_SQLITE_PATH=os.path.join(directory, "oauth_state.db"),
+        SESSION_BACKEND="sqlite",
+        SESSION_SQLITE_PATH=os.path.join(directory, "sessions.db"),
+        TOKEN_STORE_BACKEND="sqlite",
+        TOKEN_STORE_SQLITE_PATH=os.path.join(directory, "tokens.db"),
+        # All flows come from one IP
+        RATE_LIMIT_ENABLED="false",
+        LOG_SUCCESS_SAMPLE_RATE="0",
+    )
+    for prefix in PROVIDER_PREFIXES:
+        env.setdefault(f"{prefix}_CLIENT_ID", f"bench-{prefix.lower()}")
+        env.setdefault(f"{prefix}_CLIENT_SECRET", "bench-secret")
+    return env
+
+
+async def drive(app_url: str, slug: str, requests: int, concurrency: int) -> tuple[list[float], int]:
+    """Run login flows from this process; returns latencies and the error count."""
+    latencies: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = SharedTransport(limits=httpx.Limits(max_connections=concurrency))
+
+    async def one() -> None:
+        nonlocal errors
+        async with semaphore:
+            async with httpx.AsyncClient(transport=transport, base_url=app_url, timeout=30) as app_client:
+                started = time.perf_counter()
+                try:
+                    await login(app_client, provider_client, slug)
+                except Exception:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=concurrency)) as provider_client:
+        await asyncio.gather(*(one() for _ in range(requests)))
+    await transport.aclose()
+    return latencies, errors
+
+
+def drive_process(args: tuple[str, str, int, int]) -> tuple[list[float], int]:
+    return asyncio.run(drive(*args))
+
+
+def run_workers(workers: int, args: argparse.Namespace, mock_url: str) -> Result:
+    port = free_port()
+    app_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as directory:
+        server = subprocess.Popen(
+            [sys.executable, "server.py"],
+            env=server_environment(mock_url, port, workers, directory),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(f"{app_url}/api/providers", server)
+            clients = args.clients
+            share = (args.requests // clients, args.concurrency // clients or 1)
+            with multiprocessing.Pool(clients) as pool:
+                # Warm-up, so every worker has its connections and caches ready
+                pool.map(drive_process, [(app_url, args.provider, 10, 10)] * clients)
+                started = time.perf_counter()
+                parts = pool.map(drive_process, [(app_url, args.provider, *share)] * clients)
+                elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+
+    result = Result(provider=f"{workers} worker(s)", elapsed=elapsed)
+    for latencies, errors in parts:
+        result.latencies.extend(latencies)
+        result.errors += errors
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Single vs multi-worker server benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--provider", default="github", help="provider slug to log in with")
+    parser.add_argument("--requests", type=int, default=1000, help="login flows per run")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--latency", type=float, default=0.02, help="mock upstream latency in seconds")
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_provider", "--port", str(mock_port), "--latency", str(args.latency)]
+    )
+    try:
+        wait_until_up(f"{mock_url}/github/authorize?redirect_uri=http://localhost", mock)
+        results = [run_workers(workers, args, mock_url) for workers in dict.fromkeys(args.workers)]
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    print(f"{'server':<12} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for result in results:
+        print(result.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Cold-start benchmark.
+
+Measures, in fresh interpreter processes, how long ``import main`` takes and
+how long it takes from spawning a uvicorn server until its first request is
+answered, with no, one or all providers configured::
+
+    python -m benchmarks.startup --runs 10
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+PROVIDER_PREFIXES = ("GITHUB", "GOOGLE", "FEISHU", "GITEE", "LINUXDO", "OSCHINA", "WECHAT_MP", "WECHAT_OPEN")
+
+SCENARIOS: dict[str, tuple[str, ...]] = {
+    "none": (),
+    "one": ("GITHUB",),
+    "all": PROVIDER_PREFIXES,
+}
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def scenario_environment(prefixes: tuple[str, ...]) -> dict[str, str]:
+    """Environment with exactly the given providers configured.
+
+    Unconfigured providers are set to empty strings so a local ``.env`` can't
+    enable them behind the benchmark's back.
+    """
+    env = dict(os.environ)
+    for prefix in PROVIDER_PREFIXES:
+        configured = prefix in prefixes
+        env[f"{prefix}_CLIENT_ID"] = f"bench-{prefix.lower()}" if configured else ""
+        env[f"{prefix}_CLIENT_SECRET"] = "bench-secret" if configured else ""
+    return env
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env: dict[str, str]) -> float:
+    """Seconds spent in ``import main`` in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_first_request(env: dict[str, str], timeout: float = 30.0) -> float:
+    """Seconds from spawning the server until ``/api/providers`` answers."""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if client.get("/api/providers").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None:
+                    raise RuntimeError(f"server exited with code {server.returncode}")
+                time.sleep(0.005)
+        raise RuntimeError("server did not answer in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def report(name: str, label: str, samples: list[float]) -> str:
+    return (
+        f"{name:<6} {label:<14} {statistics.median(samples) * 1000:>9.1f} "
+        f"{min(samples) * 1000:>9.1f} {max(samples) * 1000:>9.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import time and time-to-first-request benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS, default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    print(f"{'conf':<6} {'measure':<14} {'median ms':>9} {'min ms':>9} {'max ms':>9}")
+    for name in args.scenarios:
+        env = scenario_environment(SCENARIOS[name])
+        imports = [measure_import(env) for _ in range(args.runs)]
+        first_requests = [measure_first_request(env) for _ in range(args.runs)]
+        print(report(name, "import main", imports))
+        print(report(name, "first request", first_requests))
+
+
+if __name__ == "__main__":
+    main()
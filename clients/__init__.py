@@ -1,20 +1,43 @@
 """OAuth clients module."""
-from .github import router as github_router
-from .google import router as google_router
-from .feishu import router as feishu_router
-from .gitee import router as gitee_router
-from .linuxdo import router as linuxdo_router
-from .oschina import router as oschina_router
-from .wechat_mp import router as wechat_mp_router
-from .wechat_open import router as wechat_open_router
+from .authorize import compile_authorize_urls
+from .health import health_snapshot, start_health, stop_health
+from .oidc import start_oidc, stop_oidc
+from .profile import UserProfile, to_profile
+from .registry import PROVIDERS, PROVIDERS_BY_SLUG, Provider, provider_clients
+from .revocation import enqueue_revocation, start_revoker, stop_revoker
+from .router import router
+from .state import state_store
+from .tokens import (
+    extend_session_grant,
+    start_token_refresher,
+    stop_token_refresher,
+    token_store,
+)
+from .transport import close_http_client, get_http_client, open_http_client
 
 __all__ = [
-    "github_router",
-    "google_router",
-    "feishu_router",
-    "gitee_router",
-    "linuxdo_router",
-    "oschina_router",
-    "wechat_mp_router",
-    "wechat_open_router",
+    "PROVIDERS",
+    "PROVIDERS_BY_SLUG",
+    "Provider",
+    "provider_clients",
+    "UserProfile",
+    "to_profile",
+    "router",
+    "compile_authorize_urls",
+    "state_store",
+    "open_http_client",
+    "close_http_client",
+    "get_http_client",
+    "start_oidc",
+    "stop_oidc",
+    "token_store",
+    "extend_session_grant",
+    "start_token_refresher",
+    "stop_token_refresher",
+    "enqueue_revocation",
+    "start_revoker",
+    "stop_revoker",
+    "health_snapshot",
+    "start_health",
+    "stop_health",
 ]
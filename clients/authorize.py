@@ -0,0 +1,82 @@
+"""Precompiled authorization URLs.
+
+A provider's authorize URL only differs between logins in ``state`` and the
+PKCE challenge. Each client renders its URL once at startup with a
+placeholder state, and requests splice their values in where the library
+would put them, so provider quirks (WeChat's ``appid`` and
+``#wechat_redirect``) are kept.
+"""
+import base64
+import hashlib
+import secrets
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from config import settings
+
+from .registry import PROVIDERS
+
+if TYPE_CHECKING:
+    from fastapi_oauth20.oauth20 import OAuth20Base
+
+# Placeholder state, only made of characters urlencode leaves alone
+_STATE_MARKER = "STATEPLACEHOLDER0"
+
+
+def code_challenge(verifier: str) -> str:
+    """S256 challenge of a PKCE code verifier: unpadded base64url of its SHA-256."""
+    digest = hashlib.sha256(verifier.encode("ascii")).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def pkce_pair() -> tuple[str, str]:
+    """A PKCE code verifier and its S256 challenge (RFC 7636)."""
+    verifier = secrets.token_urlsafe(48)
+    return verifier, code_challenge(verifier)
+
+
+@dataclass(frozen=True, slots=True)
+class AuthorizeURL:
+    """A provider's authorize URL split around its ``state`` value, and its fragment."""
+
+    head: str
+    tail: str
+    pkce: bool
+    fragment: str = ""
+
+    def build(self, state: str, code_challenge: str | None = None) -> str:
+        """Authorize URL for a URL-safe state, e.g. from ``secrets.token_urlsafe``."""
+        if code_challenge is None:
+            return f"{self.head}{state}{self.tail}{self.fragment}"
+        # Last in the query, as the library adds it after the scope
+        challenge = f"&code_challenge={code_challenge}&code_challenge_method=S256"
+        return f"{self.head}{state}{self.tail}{challenge}{self.fragment}"
+
+
+async def compile_authorize_url(name: str, client: "OAuth20Base") -> AuthorizeURL:
+    """Render a client's authorize URL once and split it at the state."""
+    url = await client.get_authorization_url(redirect_uri=PROVIDERS[name].redirect_uri, state=_STATE_MARKER)
+    head, marker, tail = url.partition(_STATE_MARKER)
+    if not marker or _STATE_MARKER in tail:
+        raise ValueError(f"Can't find the state in the {name} authorize URL: {url}")
+    tail, hash_mark, fragment = tail.partition("#")
+    return AuthorizeURL(
+        head=head, tail=tail, pkce=settings.OAUTH_PKCE and PROVIDERS[name].pkce, fragment=hash_mark + fragment
+    )
+
+
+_authorize_urls: dict[str, AuthorizeURL] = {}
+
+
+async def compile_authorize_urls(provider_clients: dict[str, "OAuth20Base"]) -> None:
+    """Precompile the authorize URL of every configured provider."""
+    for name, client in provider_clients.items():
+        _authorize_urls[name] = await compile_authorize_url(name, client)
+
+
+async def get_authorize_url(name: str, client: "OAuth20Base") -> AuthorizeURL:
+    """Precompiled authorize URL of a provider, compiled now if startup didn't."""
+    authorize_url = _authorize_urls.get(name)
+    if authorize_url is None:
+        authorize_url = _authorize_urls[name] = await compile_authorize_url(name, client)
+    return authorize_url
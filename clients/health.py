@@ -0,0 +1,145 @@
+"""Connection warm-up and reachability probes for provider endpoints.
+
+At startup a background task opens a few pooled connections to every host
+the server talks to during a login (token and userinfo endpoints), then
+keeps probing them. The app serves right away, and ``/healthz`` reports
+``starting`` until the warm-up is done, so a load balancer can hold traffic
+back until then. Probing more often than the keep-alive expiry also keeps
+those connections hot.
+"""
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import settings
+from logs import log_event, logger
+from metrics import OAUTH_PROVIDER_PROBE_SECONDS, OAUTH_PROVIDER_REACHABLE
+
+from .transport import get_http_client
+
+if TYPE_CHECKING:
+    from fastapi_oauth20.oauth20 import OAuth20Base
+
+
+@dataclass(slots=True)
+class ProviderHealth:
+    """Outcome of the latest probe of one provider."""
+
+    reachable: bool | None = None
+    rtt_ms: float | None = None
+    checked_at: float | None = None
+    error: str | None = None
+
+
+_health: dict[str, ProviderHealth] = {}
+_clients: dict[str, "OAuth20Base"] = {}
+_probe_task: asyncio.Task | None = None
+_warmed_up = False
+
+# How long shutdown waits for the probe loop to exit
+_STOP_TIMEOUT = 5.0
+
+
+def probe_urls(client: "OAuth20Base") -> list[str]:
+    """One endpoint per host the server calls during a login."""
+    urls = {}
+    for endpoint in (client.access_token_endpoint, client.userinfo_endpoint):
+        if endpoint:
+            parts = urlsplit(endpoint)
+            urls.setdefault((parts.scheme, parts.netloc), endpoint)
+    return list(urls.values())
+
+
+async def _probe_url(url: str) -> float:
+    started = time.perf_counter()
+    # Any answer means DNS, TCP and TLS are done; only 5xx counts as unhealthy
+    response = await get_http_client().head(url, timeout=settings.HEALTH_PROBE_TIMEOUT)
+    if response.status_code >= 500:
+        raise httpx.HTTPStatusError(f"{response.status_code} from {url}", request=response.request, response=response)
+    return time.perf_counter() - started
+
+
+async def probe(name: str, client: "OAuth20Base", connections: int = 1) -> ProviderHealth:
+    """Probe a provider's hosts, ``connections`` requests at a time per host."""
+    started = time.perf_counter()
+    try:
+        rtts = await asyncio.gather(*(_probe_url(url) for url in probe_urls(client) for _ in range(connections)))
+    except Exception as e:
+        health = ProviderHealth(reachable=False, checked_at=time.time(), error=f"{type(e).__name__}: {e}"[:200])
+        log_event("provider probe failed", provider=name, phase="probe", started=started, error=e)
+    else:
+        rtt = max(rtts, default=0.0)
+        health = ProviderHealth(reachable=True, rtt_ms=round(rtt * 1000, 2), checked_at=time.time())
+        OAUTH_PROVIDER_PROBE_SECONDS.labels(name).set(rtt)
+    OAUTH_PROVIDER_REACHABLE.labels(name).set(1 if health.reachable else 0)
+    _health[name] = health
+    return health
+
+
+async def _warm_up() -> None:
+    """Probe every provider over several connections, for at most HEALTH_WARMUP_TIMEOUT."""
+    tasks = [
+        asyncio.create_task(probe(name, client, settings.HEALTH_WARMUP_CONNECTIONS))
+        for name, client in _clients.items()
+    ]
+    if not tasks:
+        return
+    try:
+        # Not wait_for: before Python 3.12 it can swallow a cancel that arrives as the probes finish
+        await asyncio.wait(tasks, timeout=settings.HEALTH_WARMUP_TIMEOUT)
+    finally:
+        # Don't stay "starting" because of a slow provider, the probes below catch up
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _probe_loop() -> None:
+    global _warmed_up
+    await _warm_up()
+    _warmed_up = True
+    if settings.HEALTH_PROBE_INTERVAL <= 0 or not _clients:
+        return
+    while True:
+        await asyncio.sleep(settings.HEALTH_PROBE_INTERVAL)
+        await asyncio.gather(*(probe(name, client) for name, client in _clients.items()))
+
+
+async def start_health(provider_clients: dict[str, "OAuth20Base"]) -> None:
+    """Start warming up connections to every configured provider in the background, then keep probing them."""
+    global _probe_task
+    _clients.update(provider_clients)
+    _health.update({name: ProviderHealth() for name in provider_clients})
+    _probe_task = asyncio.create_task(_probe_loop())
+
+
+async def stop_health() -> None:
+    """Stop the warm-up and probe loop."""
+    global _probe_task, _warmed_up
+    if _probe_task is not None:
+        _probe_task.cancel()
+        # Bounded, so a probe that ignores the cancel can't hold up the rest of the shutdown
+        done, _ = await asyncio.wait({_probe_task}, timeout=_STOP_TIMEOUT)
+        if not done:
+            logger.warning("Provider probes did not stop in time", extra={"phase": "probe"})
+        elif not _probe_task.cancelled():
+            _probe_task.result()
+        _probe_task = None
+    _warmed_up = False
+    _clients.clear()
+    _health.clear()
+
+
+def health_snapshot() -> dict[str, Any]:
+    """Health payload: ``starting`` until warm-up is done, then ``ok`` or ``degraded``."""
+    if not _warmed_up:
+        status = "starting"
+    elif all(health.reachable for health in _health.values()):
+        status = "ok"
+    else:
+        status = "degraded"
+    return {"status": status, "providers": {name: asdict(health) for name, health in _health.items()}}
@@ -0,0 +1,203 @@
+"""Local ID token verification for OpenID Connect providers.
+
+Discovery metadata and signing keys are fetched and refreshed in the
+background, so a login with an ``id_token`` in the token response needs no
+userinfo round trip once they are loaded. Signatures are checked with
+``cryptography`` (``uv sync --extra oidc``); without it, or until a
+provider's keys are loaded, logins fall back to userinfo.
+"""
+import asyncio
+import base64
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from config import settings
+from logs import log_event, logger
+
+from .registry import PROVIDERS
+from .transport import provider_request
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+except ImportError:
+    rsa = None
+
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+    from fastapi_oauth20.oauth20 import OAuth20Base
+
+# Don't re-fetch JWKS for unknown key IDs more often than this
+_MIN_REFRESH_INTERVAL = 60.0
+
+# Accepted clock skew when checking exp and iat
+_LEEWAY = 60
+
+
+@dataclass
+class OIDCKeys:
+    """Discovery metadata and RSA signing keys of one provider."""
+
+    issuer: str
+    jwks_uri: str = ""
+    keys: dict[str, "RSAPublicKey"] = field(default_factory=dict)
+    expires_at: float = 0.0
+    fetched_at: float = 0.0
+
+
+_keys: dict[str, OIDCKeys] = {}
+_refresh_task: asyncio.Task | None = None
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _b64int(value: str) -> int:
+    return int.from_bytes(_b64decode(value), "big")
+
+
+def _public_key(jwk: dict[str, Any]) -> "RSAPublicKey":
+    return rsa.RSAPublicNumbers(_b64int(jwk["e"]), _b64int(jwk["n"])).public_key()
+
+
+def _max_age(cache_control: str | None) -> float:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return float(match.group(1)) if match else float(settings.OIDC_JWKS_TTL)
+
+
+async def refresh_keys(provider: str) -> None:
+    """Fetch discovery metadata (once) and the current JWKS of a provider."""
+    oidc = _keys[provider]
+    if not oidc.jwks_uri:
+        response = await provider_request(provider, "GET", f"{oidc.issuer}/.well-known/openid-configuration")
+        response.raise_for_status()
+        oidc.jwks_uri = response.json()["jwks_uri"]
+
+    response = await provider_request(provider, "GET", oidc.jwks_uri)
+    response.raise_for_status()
+    oidc.keys = {
+        jwk["kid"]: _public_key(jwk)
+        for jwk in response.json().get("keys", [])
+        if jwk.get("kty") == "RSA" and jwk.get("kid")
+    }
+    oidc.fetched_at = time.monotonic()
+    oidc.expires_at = oidc.fetched_at + _max_age(response.headers.get("cache-control"))
+
+
+async def _refresh_loop() -> None:
+    """Refresh each provider's keys shortly before they expire."""
+    while True:
+        now = time.monotonic()
+        due = [provider for provider, oidc in _keys.items() if oidc.expires_at - now < 60]
+        results = await asyncio.gather(*(refresh_keys(provider) for provider in due), return_exceptions=True)
+        for provider, result in zip(due, results):
+            if isinstance(result, Exception) and _keys[provider].fetched_at:
+                log_event("OIDC key refresh failed", provider=provider, phase="jwks", error=result)
+            elif isinstance(result, Exception):
+                log_event("OIDC discovery failed, falling back to userinfo", provider=provider, phase="jwks", error=result)
+        next_expiry = min((oidc.expires_at for oidc in _keys.values()), default=now + 3600)
+        await asyncio.sleep(max(next_expiry - time.monotonic() - 60, _MIN_REFRESH_INTERVAL))
+
+
+async def start_oidc(provider_clients: dict[str, "OAuth20Base"]) -> None:
+    """Start the refresher that loads the signing keys of enabled OIDC providers."""
+    global _refresh_task
+    if not settings.OIDC_ENABLED:
+        return
+    for name, client in provider_clients.items():
+        if PROVIDERS[name].oidc_issuer:
+            _keys[name] = OIDCKeys(issuer=client.oidc_issuer)
+    if not _keys:
+        return
+    if rsa is None:
+        logger.warning("cryptography is not installed, ID tokens are not verified locally", extra={"phase": "jwks"})
+        _keys.clear()
+        return
+    # The first load happens in the refresher too, a slow provider mustn't hold up startup
+    _refresh_task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_oidc() -> None:
+    """Stop the key refresher."""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+    _keys.clear()
+
+
+async def verify_id_token(provider: str, client: "OAuth20Base", id_token: str) -> dict[str, Any] | None:
+    """Verify an ID token locally and return its claims, or None when it can't be verified."""
+    oidc = _keys.get(provider)
+    if oidc is None or not oidc.fetched_at:
+        # Not loaded yet, the refresher fetches the keys
+        return None
+    try:
+        header_b64, payload_b64, signature_b64 = id_token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        if header.get("alg") != "RS256":
+            return None
+
+        kid = header.get("kid")
+        if kid not in oidc.keys and time.monotonic() - oidc.fetched_at >= _MIN_REFRESH_INTERVAL:
+            # Keys were probably rotated, claim the refresh before awaiting it
+            oidc.fetched_at = time.monotonic()
+            await refresh_keys(provider)
+        key = oidc.keys.get(kid)
+        if key is None:
+            return None
+
+        try:
+            key.verify(
+                _b64decode(signature_b64),
+                f"{header_b64}.{payload_b64}".encode(),
+                padding.PKCS1v15(),
+                hashes.SHA256(),
+            )
+        except InvalidSignature:
+            return None
+
+        claims = json.loads(_b64decode(payload_b64))
+    except Exception:
+        return None
+
+    now = time.time()
+    issuers = {oidc.issuer, oidc.issuer.removeprefix("https://")}
+    audience = claims.get("aud")
+    audiences = audience if isinstance(audience, list) else [audience]
+    if (
+        not claims.get("sub")
+        or claims.get("iss") not in issuers
+        or client.client_id not in audiences
+        or claims.get("exp", 0) < now - _LEEWAY
+        or claims.get("iat", now) > now + _LEEWAY
+    ):
+        return None
+    return claims
+
+
+def claims_to_userinfo(claims: dict[str, Any]) -> dict[str, Any]:
+    """Shape standard OIDC claims like Google's v1 userinfo response."""
+    user_info = {"id": claims["sub"]}
+    for claim, key in (
+        ("email", "email"),
+        ("email_verified", "verified_email"),
+        ("name", "name"),
+        ("given_name", "given_name"),
+        ("family_name", "family_name"),
+        ("picture", "picture"),
+        ("locale", "locale"),
+        ("hd", "hd"),
+    ):
+        if claim in claims:
+            user_info[key] = claims[claim]
+    return user_info
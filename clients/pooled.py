@@ -0,0 +1,134 @@
+"""Provider clients that send their requests over the shared connection pool.
+
+fastapi_oauth20 opens a fresh ``httpx.AsyncClient`` for every call and has no
+transport hook. The mixins here override the methods that send requests with
+ones that go through ``provider_request``, and are combined with the
+library's client class when a provider is loaded, so the library itself is
+left alone.
+"""
+from typing import Any
+
+import httpx
+from fastapi_oauth20.errors import AccessTokenError, GetUserInfoError, RefreshTokenError, RevokeTokenError
+from fastapi_oauth20.oauth20 import OAuth20Base
+
+from .transport import provider_request
+
+
+class PooledOAuth20(OAuth20Base):
+    """Requests of ``OAuth20Base``, sent with the provider's timeout over the shared pool."""
+
+    # Provider key, set on the combined class by pooled_client_class
+    provider_name: str
+
+    async def _request(self, method: str, url: str, *, basic_auth: bool = False, **kwargs: Any) -> httpx.Response:
+        if basic_auth:
+            kwargs["auth"] = httpx.BasicAuth(self.client_id, self.client_secret)
+        response = await provider_request(self.provider_name, method, url, **kwargs)
+        self.raise_httpx_oauth20_errors(response)
+        return response
+
+    def _client_credentials(self, data: dict[str, str], basic_auth: bool) -> dict[str, str]:
+        if not basic_auth:
+            data.update({"client_id": self.client_id, "client_secret": self.client_secret})
+        return data
+
+    async def get_access_token(self, code: str, redirect_uri: str, code_verifier: str | None = None) -> dict[str, Any]:
+        data = {"code": code, "redirect_uri": redirect_uri, "grant_type": "authorization_code"}
+        if code_verifier:
+            data["code_verifier"] = code_verifier
+        response = await self._request(
+            "POST",
+            self.access_token_endpoint,
+            basic_auth=self.token_endpoint_basic_auth,
+            data=self._client_credentials(data, self.token_endpoint_basic_auth),
+            headers=self.request_headers,
+        )
+        return self.get_json_result(response, err_class=AccessTokenError)
+
+    async def refresh_token(self, refresh_token: str) -> dict[str, Any]:
+        if self.refresh_token_endpoint is None:
+            raise RefreshTokenError("The refresh token address is missing")
+        data = {"refresh_token": refresh_token, "grant_type": "refresh_token"}
+        response = await self._request(
+            "POST",
+            self.refresh_token_endpoint,
+            basic_auth=self.token_endpoint_basic_auth,
+            data=self._client_credentials(data, self.token_endpoint_basic_auth),
+            headers=self.request_headers,
+        )
+        return self.get_json_result(response, err_class=RefreshTokenError)
+
+    async def revoke_token(self, token: str, token_type_hint: str | None = None) -> None:
+        if self.revoke_token_endpoint is None:
+            raise RevokeTokenError("The revoke token address is missing")
+        data = {"token": token}
+        if token_type_hint is not None:
+            data["token_type_hint"] = token_type_hint
+        await self._request(
+            "POST",
+            self.revoke_token_endpoint,
+            basic_auth=self.revoke_token_endpoint_basic_auth,
+            data=self._client_credentials(data, self.revoke_token_endpoint_basic_auth),
+            headers=self.request_headers,
+        )
+
+    async def get_userinfo(self, access_token: str) -> dict[str, Any]:
+        response = await self._request("GET", self.userinfo_endpoint, headers={"Authorization": f"Bearer {access_token}"})
+        return self.get_json_result(response, err_class=GetUserInfoError)
+
+
+class PooledGitHubOAuth20(PooledOAuth20):
+    """GitHub falls back to ``/user/emails`` when the profile's email is private."""
+
+    async def get_userinfo(self, access_token: str) -> dict[str, Any]:
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = await self._request("GET", self.userinfo_endpoint, headers=headers)
+        result = self.get_json_result(response, err_class=GetUserInfoError)
+        if result.get("email") is None:
+            response = await self._request("GET", f"{self.userinfo_endpoint}/emails", headers=headers)
+            emails = self.get_json_result(response, err_class=GetUserInfoError)
+            result["email"] = next((email["email"] for email in emails if email.get("primary")), emails[0]["email"])
+        return result
+
+
+class PooledWeChatOAuth20(PooledOAuth20):
+    """WeChat takes the app credentials as query parameters of GET requests."""
+
+    async def get_access_token(self, code: str) -> dict[str, Any]:
+        params = {
+            "appid": self.client_id,
+            "secret": self.client_secret,
+            "code": code,
+            "grant_type": "authorization_code",
+        }
+        response = await self._request("GET", self.access_token_endpoint, params=params, headers=self.request_headers)
+        return self.get_json_result(response, err_class=AccessTokenError)
+
+    async def refresh_token(self, refresh_token: str) -> dict[str, Any]:
+        if self.refresh_token_endpoint is None:
+            raise RefreshTokenError("The refresh token address is missing")
+        params = {"appid": self.client_id, "grant_type": "refresh_token", "refresh_token": refresh_token}
+        response = await self._request("GET", self.refresh_token_endpoint, params=params, headers=self.request_headers)
+        return self.get_json_result(response, err_class=RefreshTokenError)
+
+    async def get_userinfo(self, access_token: str, openid: str | None = None) -> dict[str, Any]:
+        if openid is None:
+            raise GetUserInfoError("openid is required")
+        params = {"access_token": access_token, "openid": openid, "lang": "zh_CN"}
+        response = await self._request("GET", self.userinfo_endpoint, params=params)
+        return self.get_json_result(response, err_class=GetUserInfoError)
+
+
+# Provider key -> mixin of providers whose requests differ from OAuth20Base's
+MIXINS: dict[str, type[PooledOAuth20]] = {
+    "github": PooledGitHubOAuth20,
+    "wechat_mp": PooledWeChatOAuth20,
+    "wechat_open": PooledWeChatOAuth20,
+}
+
+
+def pooled_client_class(provider: str, client_class: type[OAuth20Base]) -> type[OAuth20Base]:
+    """Combine a library client class with the mixin that sends its requests over the pool."""
+    mixin = MIXINS.get(provider, PooledOAuth20)
+    return type(client_class.__name__, (mixin, client_class), {"provider_name": provider})
@@ -0,0 +1,119 @@
+"""Normalized user profile shared by all providers."""
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from config import settings
+
+# Public base URL of LinuxDo, its avatar URLs are relative templates
+_LINUXDO_URL = "https://linux.do"
+
+
+@dataclass(slots=True)
+class UserProfile:
+    """The handful of user fields the app reads, whatever the provider."""
+
+    provider: str
+    id: str
+    login: str | None = None
+    name: str | None = None
+    email: str | None = None
+    avatar: str | None = None
+    # Full provider payload, only kept when USER_PROFILE_KEEP_RAW is on
+    raw: dict[str, Any] | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        """Public representation for ``/api/user`` and the template."""
+        data = {
+            "provider": self.provider,
+            "id": self.id,
+            "login": self.login,
+            "name": self.name,
+            "email": self.email,
+            "avatar": self.avatar,
+        }
+        if self.raw is not None:
+            data["raw"] = self.raw
+        return data
+
+    def to_session(self) -> list[Any]:
+        """Positional form stored in the session, no repeated keys."""
+        values = [self.provider, self.id, self.login, self.name, self.email, self.avatar]
+        if self.raw is not None:
+            values.append(self.raw)
+        return values
+
+    @classmethod
+    def from_session(cls, value: Any) -> "UserProfile | None":
+        """Rebuild a profile from ``to_session`` output, None for anything else (e.g. older sessions)."""
+        if not isinstance(value, list) or not 6 <= len(value) <= 7:
+            return None
+        return cls(*value)
+
+
+def _str(value: Any) -> str | None:
+    return str(value) if value not in (None, "") else None
+
+
+def _github(data: dict[str, Any]) -> tuple:
+    return data.get("id"), data.get("login"), data.get("name"), data.get("email"), data.get("avatar_url")
+
+
+def _google(data: dict[str, Any]) -> tuple:
+    email = data.get("email")
+    return data.get("id") or data.get("sub"), email, data.get("name"), email, data.get("picture")
+
+
+def _feishu(data: dict[str, Any]) -> tuple:
+    return (
+        data.get("open_id") or data.get("sub"),
+        data.get("user_id"),
+        data.get("name"),
+        data.get("email") or data.get("enterprise_email"),
+        data.get("avatar_url") or data.get("picture"),
+    )
+
+
+def _linuxdo(data: dict[str, Any]) -> tuple:
+    avatar = data.get("avatar_template")
+    if avatar:
+        avatar = avatar.replace("{size}", "120")
+        if avatar.startswith("/"):
+            avatar = _LINUXDO_URL + avatar
+    return data.get("id"), data.get("username") or data.get("login"), data.get("name"), data.get("email"), avatar
+
+
+def _oschina(data: dict[str, Any]) -> tuple:
+    return data.get("id"), data.get("name"), data.get("name"), data.get("email"), data.get("avatar")
+
+
+def _wechat(data: dict[str, Any]) -> tuple:
+    return data.get("openid"), None, data.get("nickname"), None, data.get("headimgurl")
+
+
+# Provider key -> (id, login, name, email, avatar) from the provider's userinfo payload
+PROJECTIONS: dict[str, Callable[[dict[str, Any]], tuple]] = {
+    "github": _github,
+    "google": _google,
+    "feishu": _feishu,
+    "gitee": _github,
+    "linuxdo": _linuxdo,
+    "oschina": _oschina,
+    "wechat_mp": _wechat,
+    "wechat_open": _wechat,
+}
+
+
+def to_profile(provider: str, data: dict[str, Any]) -> UserProfile:
+    """Project a provider's userinfo payload onto a UserProfile."""
+    user_id, login, name, email, avatar = PROJECTIONS[provider](data)
+    if user_id in (None, ""):
+        raise ValueError(f"{provider} userinfo has no user ID")
+    return UserProfile(
+        provider=provider,
+        id=str(user_id),
+        login=_str(login),
+        name=_str(name),
+        email=_str(email),
+        avatar=_str(avatar),
+        raw=data if settings.USER_PROFILE_KEEP_RAW else None,
+    )
@@ -0,0 +1,164 @@
+"""OAuth provider registry.
+
+Client classes are referenced by import path and only imported for providers
+that are configured, so an unconfigured provider costs nothing at startup.
+"""
+import importlib
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from config import settings
+
+if TYPE_CHECKING:
+    from fastapi_oauth20 import FastAPIOAuth20
+    from fastapi_oauth20.oauth20 import OAuth20Base
+
+
+@dataclass(frozen=True)
+class Provider:
+    """Static description of an OAuth provider."""
+
+    # Provider key used in sessions and settings checks, e.g. "linuxdo"
+    name: str
+    # Human readable name for logs and UI
+    title: str
+    # "module:Class" path of the fastapi_oauth20 client
+    client_path: str
+    # Settings prefix, e.g. "GITHUB" for GITHUB_CLIENT_ID / GITHUB_CLIENT_SECRET / GITHUB_REDIRECT_URI
+    settings_prefix: str
+    # URL path segment, e.g. "linux-do" in /api/v1/oauth2/linux-do/callback
+    slug: str
+    # token_data keys passed to get_userinfo after the access token
+    userinfo_args: tuple[str, ...] = ()
+    # token_data key holding a stable user ID, when the token response has one
+    subject_key: str | None = None
+    # OpenID Connect issuer, enables local ID token verification
+    oidc_issuer: str | None = None
+    # Whether the provider takes a PKCE (S256) challenge
+    pkce: bool = False
+    # Token revocation URL of providers without an RFC 7009 endpoint, "{client_id}" is filled in
+    revoke_url: str | None = None
+
+    @property
+    def client_id(self) -> str:
+        return getattr(settings, f"{self.settings_prefix}_CLIENT_ID")
+
+    @property
+    def client_secret(self) -> str:
+        return getattr(settings, f"{self.settings_prefix}_CLIENT_SECRET")
+
+    @property
+    def redirect_uri(self) -> str:
+        return getattr(settings, f"{self.settings_prefix}_REDIRECT_URI")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.client_id and self.client_secret)
+
+    def load_client_class(self) -> type["OAuth20Base"]:
+        """Import the provider's client class, with its requests sent over the shared pool."""
+        from .pooled import pooled_client_class
+
+        module_name, _, class_name = self.client_path.partition(":")
+        return pooled_client_class(self.name, getattr(importlib.import_module(module_name), class_name))
+
+
+PROVIDERS: dict[str, Provider] = {
+    provider.name: provider
+    for provider in (
+        Provider(
+            "github",
+            "GitHub",
+            "fastapi_oauth20.clients.github:GitHubOAuth20",
+            "GITHUB",
+            "github",
+            pkce=True,
+            revoke_url="https://api.github.com/applications/{client_id}/token",
+        ),
+        Provider(
+            "google",
+            "Google",
+            "fastapi_oauth20.clients.google:GoogleOAuth20",
+            "GOOGLE",
+            "google",
+            oidc_issuer="https://accounts.google.com",
+            pkce=True,
+        ),
+        Provider("feishu", "FeiShu", "fastapi_oauth20.clients.feishu:FeiShuOAuth20", "FEISHU", "feishu"),
+        Provider("gitee", "Gitee", "fastapi_oauth20.clients.gitee:GiteeOAuth20", "GITEE", "gitee"),
+        Provider("linuxdo", "LinuxDo", "fastapi_oauth20.clients.linuxdo:LinuxDoOAuth20", "LINUXDO", "linux-do"),
+        Provider("oschina", "OSChina", "fastapi_oauth20.clients.oschina:OSChinaOAuth20", "OSCHINA", "oschina"),
+        Provider(
+            "wechat_mp",
+            "WeChat Mini Program",
+            "fastapi_oauth20.clients.weixin_mp:WeChatMpOAuth20",
+            "WECHAT_MP",
+            "wechat_mp",
+            ("openid",),
+            "openid",
+        ),
+        Provider(
+            "wechat_open",
+            "WeChat Open Platform",
+            "fastapi_oauth20.clients.weixin_open:WeChatOpenOAuth20",
+            "WECHAT_OPEN",
+            "wechat_open",
+            ("openid",),
+            "openid",
+        ),
+    )
+}
+
+# URL slug -> provider, for route dispatch
+PROVIDERS_BY_SLUG: dict[str, Provider] = {provider.slug: provider for provider in PROVIDERS.values()}
+
+
+def use_mock_endpoints(name: str, client: "OAuth20Base", base_url: str) -> None:
+    """Rewrite a client's endpoints to the local mock provider."""
+    base = f"{base_url.rstrip('/')}/{name}"
+    client.authorize_endpoint = f"{base}/authorize"
+    client.access_token_endpoint = f"{base}/token"
+    client.userinfo_endpoint = f"{base}/userinfo"
+    if client.refresh_token_endpoint:
+        client.refresh_token_endpoint = f"{base}/token"
+    if client.revoke_token_endpoint:
+        client.revoke_token_endpoint = f"{base}/revoke"
+    if client.oidc_issuer:
+        client.oidc_issuer = base
+    if client.revoke_url:
+        client.revoke_url = f"{base}/revoke"
+
+
+def build_clients() -> dict[str, "OAuth20Base"]:
+    """Instantiate a client for every configured provider."""
+    clients = {
+        provider.name: provider.load_client_class()(client_id=provider.client_id, client_secret=provider.client_secret)
+        for provider in PROVIDERS.values()
+        if provider.enabled
+    }
+    for name, client in clients.items():
+        # Set beside the library's endpoints, so mock mode rewrites them along with those
+        provider = PROVIDERS[name]
+        client.oidc_issuer = provider.oidc_issuer
+        client.revoke_url = provider.revoke_url.format(client_id=client.client_id) if provider.revoke_url else None
+    if settings.OAUTH_MOCK_PROVIDER_URL:
+        for name, client in clients.items():
+            use_mock_endpoints(name, client, settings.OAUTH_MOCK_PROVIDER_URL)
+    return clients
+
+
+# Provider key -> client, only for configured providers
+provider_clients = build_clients()
+
+
+def build_callback_handlers(clients: dict[str, "OAuth20Base"]) -> dict[str, "FastAPIOAuth20"]:
+    """Wrap each client in the callback dependency that exchanges the authorization code."""
+    if not clients:
+        return {}
+    from fastapi_oauth20 import FastAPIOAuth20
+
+    return {name: FastAPIOAuth20(client, redirect_uri=PROVIDERS[name].redirect_uri) for name, client in clients.items()}
+
+
+# Provider key -> callback dependency, only for configured providers
+callback_handlers = build_callback_handlers(provider_clients)
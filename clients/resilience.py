@@ -0,0 +1,155 @@
+"""Deadlines, retries and circuit breaking for provider calls."""
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+
+from fastapi import HTTPException
+
+from config import settings
+from metrics import OAUTH_CIRCUIT_OPEN
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        super().__init__(f"{provider} is temporarily unavailable")
+
+
+class CircuitBreaker:
+    """Opens after consecutive upstream failures, half-opens after a cool-down."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        provider: str,
+        failure_threshold: int,
+        recovery_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    @property
+    def available(self) -> bool:
+        """Whether new logins should be started, without claiming the half-open probe."""
+        if self.state == self.OPEN:
+            return self.clock() - self.opened_at >= self.recovery_timeout
+        return True
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; in half-open state only one probe is let through."""
+        if self.state == self.OPEN:
+            if self.clock() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def release(self) -> None:
+        """Give up a call without a verdict, e.g. when the request was cancelled."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+        OAUTH_CIRCUIT_OPEN.labels(self.provider).set(0)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = self.clock()
+            OAUTH_CIRCUIT_OPEN.labels(self.provider).set(1)
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """Get the circuit breaker of a provider."""
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = _breakers[provider] = CircuitBreaker(
+            provider,
+            failure_threshold=settings.PROVIDER_CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=settings.PROVIDER_CIRCUIT_RECOVERY_TIMEOUT,
+        )
+    return breaker
+
+
+def is_available(provider: str) -> bool:
+    """Whether the provider's circuit lets new logins start."""
+    return get_breaker(provider).available
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether an error points at an unhealthy provider rather than a bad request."""
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    # Missing code or an error sent back by the provider (OAuth20AuthorizeCallbackError), nothing was called
+    if isinstance(exc, HTTPException) and exc.status_code < 500:
+        return False
+    # fastapi_oauth20 errors carry the upstream response, or None for network errors
+    if hasattr(exc, "response"):
+        response = exc.response
+        return response is None or response.status_code >= 500 or response.status_code == 429
+    return False
+
+
+async def guarded_call(provider: str, call: Callable[[], Awaitable[T]], *, idempotent: bool = False) -> T:
+    """Call a provider under its deadline and circuit breaker.
+
+    Idempotent calls are retried on transient errors with jittered exponential
+    backoff, as long as the overall deadline allows another attempt.
+    """
+    breaker = get_breaker(provider)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.PROVIDER_DEADLINE
+    attempts = 1 + (settings.PROVIDER_RETRIES if idempotent else 0)
+
+    for attempt in range(attempts):
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            # Nothing was sent, so this says nothing about the provider's health
+            raise asyncio.TimeoutError
+        if not breaker.allow():
+            raise CircuitOpenError(provider)
+        try:
+            result = await asyncio.wait_for(call(), timeout=remaining)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if not is_transient(e):
+                # The provider answered, it is just not happy with this request
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            backoff = random.uniform(0, settings.PROVIDER_RETRY_BACKOFF * 2**attempt)
+            if attempt + 1 >= attempts or loop.time() + backoff >= deadline:
+                raise
+            await asyncio.sleep(backoff)
+        else:
+            breaker.record_success()
+            return result
@@ -0,0 +1,147 @@
+"""Background revocation of provider tokens after logout.
+
+Logout hands the grant to an in-process queue and returns right away. A
+worker drains the queue in batches, with a concurrency cap per provider, and
+transient failures are queued again after a jittered exponential backoff.
+"""
+import asyncio
+import random
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+import httpx
+
+from config import settings
+from logs import logger
+from metrics import OAUTH_TOKEN_REVOCATIONS, track_phase
+
+from .resilience import CircuitOpenError, guarded_call, is_transient
+from .transport import provider_request
+
+if TYPE_CHECKING:
+    from fastapi_oauth20.oauth20 import OAuth20Base
+
+    from .tokens import TokenGrant
+
+
+async def _revoke_rfc7009(client: "OAuth20Base", grant: "TokenGrant") -> None:
+    # Revoking the refresh token also ends its access tokens (RFC 7009)
+    if grant.refresh_token:
+        await client.revoke_token(grant.refresh_token, token_type_hint="refresh_token")
+    else:
+        await client.revoke_token(grant.access_token, token_type_hint="access_token")
+
+
+async def _revoke_github(client: "OAuth20Base", grant: "TokenGrant") -> None:
+    # GitHub has no RFC 7009 endpoint, OAuth app tokens are deleted through the REST API
+    response = await provider_request(
+        "github",
+        "DELETE",
+        client.revoke_url,
+        json={"access_token": grant.access_token},
+        auth=httpx.BasicAuth(client.client_id, client.client_secret),
+        headers=client.request_headers,
+    )
+    # 404 means the token is already gone
+    if response.status_code != 404:
+        client.raise_httpx_oauth20_errors(response)
+
+
+# Providers revoked some other way than the client's revoke_token_endpoint
+REVOKERS: dict[str, Callable[["OAuth20Base", "TokenGrant"], Awaitable[None]]] = {
+    "github": _revoke_github,
+}
+
+
+def supports_revocation(provider: str, client: "OAuth20Base") -> bool:
+    """Whether tokens of a provider can be revoked."""
+    return provider in REVOKERS or bool(client.revoke_token_endpoint)
+
+
+_clients: dict[str, "OAuth20Base"] = {}
+_queue: asyncio.Queue | None = None
+_semaphores: dict[str, asyncio.Semaphore] = {}
+_worker: asyncio.Task | None = None
+_retries: set[asyncio.Task] = set()
+
+
+def enqueue_revocation(grant: "TokenGrant", attempt: int = 0) -> bool:
+    """Queue a grant's tokens for revocation without waiting; False when that isn't possible."""
+    if _queue is None or grant.provider not in _clients:
+        return False
+    try:
+        _queue.put_nowait((grant, attempt))
+    except asyncio.QueueFull:
+        OAUTH_TOKEN_REVOCATIONS.labels(grant.provider, "dropped").inc()
+        logger.warning(
+            "Token revocation dropped, queue full", extra={"provider": grant.provider, "phase": "token_revoke"}
+        )
+        return False
+    return True
+
+
+async def _retry_later(grant: "TokenGrant", attempt: int) -> None:
+    await asyncio.sleep(random.uniform(0, settings.TOKEN_REVOKE_BACKOFF * 2**attempt))
+    enqueue_revocation(grant, attempt)
+
+
+async def _revoke(grant: "TokenGrant", attempt: int) -> None:
+    client = _clients[grant.provider]
+    revoker = REVOKERS.get(grant.provider, _revoke_rfc7009)
+    async with _semaphores[grant.provider]:
+        try:
+            with track_phase(grant.provider, "token_revoke"):
+                # Retries are queued instead, so a backoff never holds a concurrency slot
+                await guarded_call(grant.provider, lambda: revoker(client, grant))
+        except Exception as e:
+            if (isinstance(e, CircuitOpenError) or is_transient(e)) and attempt < settings.TOKEN_REVOKE_RETRIES:
+                OAUTH_TOKEN_REVOCATIONS.labels(grant.provider, "retry").inc()
+                task = asyncio.create_task(_retry_later(grant, attempt + 1))
+                _retries.add(task)
+                task.add_done_callback(_retries.discard)
+            else:
+                OAUTH_TOKEN_REVOCATIONS.labels(grant.provider, "failure").inc()
+            return
+    OAUTH_TOKEN_REVOCATIONS.labels(grant.provider, "success").inc()
+
+
+async def _revoke_loop(queue: asyncio.Queue) -> None:
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < settings.TOKEN_REVOKE_BATCH_SIZE and not queue.empty():
+            batch.append(queue.get_nowait())
+        try:
+            await asyncio.gather(*(_revoke(grant, attempt) for grant, attempt in batch))
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+
+async def start_revoker(provider_clients: dict[str, "OAuth20Base"]) -> None:
+    """Start the revocation worker for providers that support it."""
+    global _queue, _worker
+    _clients.update({name: client for name, client in provider_clients.items() if supports_revocation(name, client)})
+    if not settings.TOKEN_REVOKE_ON_LOGOUT or not _clients:
+        _clients.clear()
+        return
+    _semaphores.update({name: asyncio.Semaphore(settings.TOKEN_REVOKE_CONCURRENCY) for name in _clients})
+    _queue = asyncio.Queue(maxsize=settings.TOKEN_REVOKE_QUEUE_SIZE)
+    _worker = asyncio.create_task(_revoke_loop(_queue))
+
+
+async def stop_revoker() -> None:
+    """Give queued revocations a moment to finish, then stop the worker."""
+    global _queue, _worker
+    if _worker is not None:
+        try:
+            await asyncio.wait_for(_queue.join(), timeout=settings.TOKEN_REVOKE_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "%d token revocation(s) abandoned at shutdown", _queue.qsize(), extra={"phase": "token_revoke"}
+            )
+        for task in (_worker, *_retries):
+            task.cancel()
+        await asyncio.gather(_worker, *_retries, return_exceptions=True)
+        _worker = None
+        _queue = None
+    _clients.clear()
+    _semaphores.clear()
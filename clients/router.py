@@ -0,0 +1,170 @@
+"""OAuth authorize and callback routes shared by all providers."""
+import time
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse
+
+from config import settings
+from logs import log_event
+from metrics import OAUTH_CALLBACKS, OAUTH_CALLBACKS_SHARED, track_phase
+
+from .authorize import get_authorize_url, pkce_pair
+from .profile import to_profile
+from .registry import PROVIDERS_BY_SLUG, Provider, callback_handlers, provider_clients
+from .resilience import CircuitOpenError, guarded_call, is_available, is_transient
+from .singleflight import SingleFlight
+from .state import STATE_COOKIE, InvalidStateError, is_bound, state_binding, state_store
+from .tokens import replace_grant, save_grant
+from .userinfo import fetch_userinfo
+
+if TYPE_CHECKING:
+    from fastapi_oauth20.oauth20 import OAuth20Base
+
+router = APIRouter()
+
+# In-flight logins keyed by (provider, authorization code, state, state cookie). The state and its cookie
+# are part of the key, so only a request from the same browser (a double click) can join a login; any other
+# request runs its own and fails the state check.
+login_flights = SingleFlight()
+
+
+@router.get("/api/v1/oauth2/{provider}/authorize")
+async def oauth2_authorize(provider: str):
+    """Initiate OAuth login with the given provider."""
+    spec = PROVIDERS_BY_SLUG.get(provider)
+    if spec is None:
+        # Unknown slug, as for any route that doesn't exist
+        raise HTTPException(status_code=404)
+    client = provider_clients.get(spec.name)
+    if not client:
+        return RedirectResponse(url="/?error=provider_not_supported")
+    if not is_available(spec.name):
+        return RedirectResponse(url=f"/?error=provider_unavailable&provider={spec.name}")
+
+    with track_phase(spec.name, "authorize_url"):
+        authorize_url = await get_authorize_url(spec.name, client)
+        if authorize_url.pkce:
+            code_verifier, code_challenge = pkce_pair()
+            state = await state_store.issue(spec.name, {"code_verifier": code_verifier})
+        else:
+            code_challenge = None
+            state = await state_store.issue(spec.name)
+        auth_url = authorize_url.build(state, code_challenge)
+    response = RedirectResponse(url=auth_url)
+    # Lax still sends it on the provider's top-level redirect back to the callback
+    response.set_cookie(
+        STATE_COOKIE,
+        state_binding(state),
+        max_age=settings.OAUTH_STATE_TTL,
+        path=urlsplit(spec.redirect_uri).path or "/",
+        httponly=True,
+        samesite="lax",
+    )
+    return response
+
+
+async def login(
+    request: Request,
+    spec: Provider,
+    client: "OAuth20Base",
+    code: str | None,
+    state: str | None,
+    code_verifier: str | None,
+    error: str | None,
+) -> tuple[dict[str, Any], str | None]:
+    """Check the state, exchange the authorization code and fetch the user's profile.
+
+    Returns the profile and the ID of the stored token grant, if the tokens can be refreshed.
+    """
+    if code is None or error is not None:
+        # Denied or malformed callback: the provider isn't called, so its circuit breaker must not see it
+        raise HTTPException(status_code=400, detail=error)
+
+    # The state itself is a CSRF token, it never goes into the logs
+    if not state:
+        raise InvalidStateError("missing state")
+    if not is_bound(state, request.cookies.get(STATE_COOKIE)):
+        # Login CSRF: someone else's callback URL, e.g. one an attacker started and sent to the victim
+        raise InvalidStateError("state not issued to this browser")
+    data = await state_store.consume(state, spec.name)
+    if data is None:
+        raise InvalidStateError("unknown, used or expired state")
+    # A verifier kept at authorize time wins over one sent along with the callback
+    code_verifier = data.get("code_verifier", code_verifier)
+
+    with track_phase(spec.name, "token_exchange"):
+        # Authorization codes are single use, so the exchange is never retried
+        token_data, state = await guarded_call(
+            spec.name,
+            lambda: callback_handlers[spec.name](
+                request, code=code, state=state, code_verifier=code_verifier, error=error
+            ),
+        )
+
+    user_info = await fetch_userinfo(spec, client, token_data)
+    return user_info, await save_grant(spec.name, client, token_data)
+
+
+def record_callback(provider: str, result: str, started: float, error: BaseException | None = None) -> None:
+    """Count and log the outcome of a callback."""
+    OAUTH_CALLBACKS.labels(provider, result).inc()
+    log_event("callback", provider=provider, phase="callback", started=started, result=result, error=error)
+
+
+@router.get("/api/v1/oauth2/{provider}/callback")
+async def oauth2_callback(
+    request: Request,
+    provider: str,
+    code: str | None = None,
+    state: str | None = None,
+    code_verifier: str | None = None,
+    error: str | None = None,
+):
+    """Handle OAuth callback from the given provider."""
+    spec = PROVIDERS_BY_SLUG.get(provider)
+    if spec is None:
+        # Unknown slug, as for any route that doesn't exist
+        raise HTTPException(status_code=404)
+    client = provider_clients.get(spec.name)
+    if not client:
+        return RedirectResponse(url="/?error=provider_not_supported")
+
+    started = time.perf_counter()
+    try:
+        if code is None or error is not None:
+            user_info, grant_id = await login(request, spec, client, code, state, code_verifier, error)
+        else:
+            # Double clicks and browser retries deliver the same code more than once
+            (user_info, grant_id), shared = await login_flights.do(
+                (spec.name, code, state, request.cookies.get(STATE_COOKIE)),
+                lambda: login(request, spec, client, code, state, code_verifier, error),
+            )
+            if shared:
+                OAUTH_CALLBACKS_SHARED.labels(spec.name).inc()
+
+        # Store user in session
+        request.session["user"] = to_profile(spec.name, user_info).to_session()
+        previous_grant_id = request.session.get("grant")
+        if previous_grant_id and previous_grant_id != grant_id:
+            await replace_grant(previous_grant_id)
+        if grant_id is not None:
+            request.session["grant"] = grant_id
+        elif previous_grant_id:
+            del request.session["grant"]
+
+        record_callback(spec.name, "success", started)
+        return RedirectResponse(url="/")
+    except InvalidStateError as e:
+        record_callback(spec.name, "invalid_state", started, e)
+        return RedirectResponse(url="/?error=invalid_state")
+    except Exception as e:
+        record_callback(spec.name, "failure", started, e)
+        # Timeouts, connection errors and 5xx/429 from the provider, same as the circuit breaker counts them
+        if isinstance(e, CircuitOpenError) or is_transient(e):
+            return RedirectResponse(url=f"/?error=provider_unavailable&provider={spec.name}")
+        if isinstance(e, HTTPException):
+            raise
+        error_msg = str(e)
+        return RedirectResponse(url=f"/?error=oauth_failed&provider={spec.name}&details={error_msg[:100]}")
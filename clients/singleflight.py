@@ -0,0 +1,37 @@
+"""Single-flight deduplication of concurrent identical calls."""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers with the same key share its result."""
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Run ``call`` or join the one already running for ``key``.
+
+        Returns the result and whether it was shared from another caller. The
+        call runs in its own task, so a caller going away does not cancel it
+        for the others.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(call())
+        self._calls[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task), False
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved when every caller has gone away
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,150 @@
+"""Server-side record of issued OAuth ``state`` values."""
+import hashlib
+import heapq
+import hmac
+import json
+import secrets
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+from config import settings
+from sqlitedb import SQLiteDatabase
+
+
+class InvalidStateError(Exception):
+    """Raised when a callback's state was never issued, already used or expired."""
+
+
+# Cookie that ties an issued state to the browser that started the flow, scoped to the provider's callback path
+STATE_COOKIE = "oauth_state"
+
+
+def state_binding(state: str) -> str:
+    """Value of the state cookie: an HMAC of the state, so the cookie doesn't carry the state itself."""
+    return hmac.new(settings.SESSION_SECRET_KEY.encode(), state.encode(), hashlib.sha256).hexdigest()
+
+
+def is_bound(state: str, binding: str | None) -> bool:
+    """Whether the callback's state was issued to the browser that sent this state cookie."""
+    return binding is not None and hmac.compare_digest(binding, state_binding(state))
+
+
+class StateStore(ABC):
+    """Base class for state backends.
+
+    ``issue`` creates a single-use state bound to a provider, ``consume``
+    atomically removes it and returns the data stored with it.
+    """
+
+    @abstractmethod
+    async def issue(self, provider: str, data: dict[str, Any] | None = None) -> str:
+        ...
+
+    @abstractmethod
+    async def consume(self, state: str, provider: str) -> dict[str, Any] | None:
+        ...
+
+    async def close(self) -> None:
+        return None
+
+
+class MemoryStateStore(StateStore):
+    """In-process store with heap-ordered expiry and a hard entry cap."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: dict[str, tuple[float, str, dict[str, Any]]] = {}
+        self._expiry: list[tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float) -> None:
+        # Only looks at the heap top, consumed states are dropped lazily
+        while self._expiry and (self._expiry[0][0] <= now or len(self._entries) >= self.max_entries):
+            expires, state = heapq.heappop(self._expiry)
+            entry = self._entries.get(state)
+            if entry is not None and entry[0] == expires:
+                del self._entries[state]
+        if len(self._expiry) > 2 * self.max_entries:
+            # Too many consumed states still queued, keep the heap bounded too
+            self._expiry = [(entry[0], state) for state, entry in self._entries.items()]
+            heapq.heapify(self._expiry)
+
+    async def issue(self, provider: str, data: dict[str, Any] | None = None) -> str:
+        now = time.monotonic()
+        self._expire(now)
+        state = secrets.token_urlsafe(24)
+        expires = now + self.ttl
+        self._entries[state] = (expires, provider, data or {})
+        heapq.heappush(self._expiry, (expires, state))
+        return state
+
+    async def consume(self, state: str, provider: str) -> dict[str, Any] | None:
+        entry = self._entries.pop(state, None)
+        if entry is None:
+            return None
+        expires, issued_for, data = entry
+        if expires <= time.monotonic() or issued_for != provider:
+            return None
+        return data
+
+
+class SQLiteStateStore(StateStore):
+    """File-backed store, so the callback can land on any worker process."""
+
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        self.db = SQLiteDatabase(
+            path,
+            "CREATE TABLE IF NOT EXISTS oauth_state "
+            "(state TEXT PRIMARY KEY, provider TEXT NOT NULL, data TEXT NOT NULL, expires REAL NOT NULL)",
+        )
+
+    def _issue(self, state: str, provider: str, data: str) -> None:
+        now = time.time()
+        with self.db.connection() as conn:
+            conn.execute(
+                "INSERT INTO oauth_state (state, provider, data, expires) VALUES (?, ?, ?, ?)",
+                (state, provider, data, now + self.ttl),
+            )
+            if self.db.purge_due():
+                conn.execute("DELETE FROM oauth_state WHERE expires < ?", (now,))
+
+    def _consume(self, state: str, provider: str) -> dict[str, Any] | None:
+        # Immediate transaction so two workers can't both consume the same state
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT provider, data, expires FROM oauth_state WHERE state = ?",
+                (state,),
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM oauth_state WHERE state = ?", (state,))
+        if row is None or row[0] != provider or row[2] < time.time():
+            return None
+        return json.loads(row[1])
+
+    async def issue(self, provider: str, data: dict[str, Any] | None = None) -> str:
+        state = secrets.token_urlsafe(24)
+        await self.db.run(self._issue, state, provider, json.dumps(data or {}))
+        return state
+
+    async def consume(self, state: str, provider: str) -> dict[str, Any] | None:
+        return await self.db.run(self._consume, state, provider)
+
+    async def close(self) -> None:
+        self.db.close()
+
+
+def create_state_store() -> StateStore:
+    """Build the state store for the configured backend."""
+    if settings.OAUTH_STATE_BACKEND == "memory":
+        return MemoryStateStore(ttl=settings.OAUTH_STATE_TTL, max_entries=settings.OAUTH_STATE_MAX_ENTRIES)
+    if settings.OAUTH_STATE_BACKEND == "sqlite":
+        return SQLiteStateStore(settings.OAUTH_STATE_SQLITE_PATH, ttl=settings.OAUTH_STATE_TTL)
+    raise ValueError(f"Unknown OAuth state backend: {settings.OAUTH_STATE_BACKEND}")
+
+
+state_store = create_state_store()
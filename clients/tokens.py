@@ -0,0 +1,415 @@
+"""Server-side token grants and their background refresh.
+
+Sessions only carry a grant ID. The access and refresh tokens stay on the
+server, where a scheduler renews them shortly before they expire, a batch per
+provider at a time, and revokes them once their session has ended.
+"""
+import asyncio
+import heapq
+import json
+import secrets
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from config import settings
+from logs import log_event
+from metrics import OAUTH_TOKEN_REFRESHES, track_phase
+from sqlitedb import SQLiteDatabase
+
+from .registry import PROVIDERS
+from .resilience import CircuitOpenError, guarded_call, is_transient
+from .revocation import enqueue_revocation, supports_revocation
+from .singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from fastapi_oauth20.oauth20 import OAuth20Base
+
+# Assumed access token lifetime when the token response has no expires_in
+_DEFAULT_EXPIRES_IN = 3600
+
+
+@dataclass(slots=True)
+class TokenGrant:
+    """Tokens of one login, valid until the session that owns them ends."""
+
+    provider: str
+    access_token: str
+    refresh_token: str | None
+    # Wall clock times, so they survive restarts and are shared by workers
+    expires_at: float
+    session_expires_at: float
+    # token_data values needed by later calls, e.g. WeChat's openid
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def due_at(self) -> float:
+        """When the scheduler should next look at this grant."""
+        if not self.refresh_token:
+            return self.session_expires_at
+        return min(self.expires_at - settings.TOKEN_REFRESH_MARGIN, self.session_expires_at)
+
+
+class TokenStore(ABC):
+    """Base class for grant backends.
+
+    ``lease_due`` hands out grants that are due, and hides them from other
+    callers for ``lease`` seconds so two workers never refresh the same grant.
+    """
+
+    @abstractmethod
+    async def get(self, grant_id: str) -> TokenGrant | None:
+        ...
+
+    @abstractmethod
+    async def save(self, grant_id: str, grant: TokenGrant) -> None:
+        ...
+
+    @abstractmethod
+    async def update(self, grant_id: str, grant: TokenGrant) -> bool:
+        """Save a grant only if it still exists; False once it was deleted, e.g. by a logout."""
+
+    @abstractmethod
+    async def delete(self, grant_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def pop(self, grant_id: str) -> TokenGrant | None:
+        """Delete a grant and return it, None if it was already gone."""
+
+    @abstractmethod
+    async def extend(self, grant_id: str, session_expires_at: float) -> None:
+        """Move a grant's session expiry later, when its session was renewed."""
+
+    @abstractmethod
+    async def lease_due(self, provider: str, now: float, lease: float, limit: int) -> list[tuple[str, TokenGrant]]:
+        ...
+
+    async def close(self) -> None:
+        return None
+
+
+class MemoryTokenStore(TokenStore):
+    """In-process store with a due-time heap per provider, for a single worker."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._grants: dict[str, TokenGrant] = {}
+        self._due: dict[str, float] = {}
+        self._heaps: dict[str, list[tuple[float, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._grants)
+
+    def _schedule(self, grant_id: str, provider: str, due_at: float) -> None:
+        self._due[grant_id] = due_at
+        heapq.heappush(self._heaps.setdefault(provider, []), (due_at, grant_id))
+
+    async def get(self, grant_id: str) -> TokenGrant | None:
+        return self._grants.get(grant_id)
+
+    async def save(self, grant_id: str, grant: TokenGrant) -> None:
+        if grant_id not in self._grants and len(self._grants) >= self.max_entries:
+            self._evict()
+        self._grants[grant_id] = grant
+        self._schedule(grant_id, grant.provider, grant.due_at)
+
+    def _evict(self) -> None:
+        """Make room for a grant: one whose session ended is revoked, else the oldest is dropped unrevoked."""
+        now = time.time()
+        # Grants are in login order, so ended sessions are usually found first
+        ended = next((grant_id for grant_id, grant in self._grants.items() if grant.session_expires_at <= now), None)
+        if ended is not None:
+            self._due.pop(ended, None)
+            enqueue_revocation(self._grants.pop(ended))
+            return
+        # Its session is still using the tokens, so they are only forgotten, not revoked
+        oldest = next(iter(self._grants))
+        self._due.pop(oldest, None)
+        del self._grants[oldest]
+
+    async def update(self, grant_id: str, grant: TokenGrant) -> bool:
+        if grant_id not in self._grants:
+            return False
+        await self.save(grant_id, grant)
+        return True
+
+    async def delete(self, grant_id: str) -> None:
+        # Heap entries of deleted grants are skipped when they come up
+        self._grants.pop(grant_id, None)
+        self._due.pop(grant_id, None)
+
+    async def pop(self, grant_id: str) -> TokenGrant | None:
+        self._due.pop(grant_id, None)
+        return self._grants.pop(grant_id, None)
+
+    async def extend(self, grant_id: str, session_expires_at: float) -> None:
+        grant = self._grants.get(grant_id)
+        if grant is not None and session_expires_at > grant.session_expires_at:
+            grant.session_expires_at = session_expires_at
+            self._schedule(grant_id, grant.provider, grant.due_at)
+
+    async def lease_due(self, provider: str, now: float, lease: float, limit: int) -> list[tuple[str, TokenGrant]]:
+        heap = self._heaps.get(provider, [])
+        leased = []
+        while heap and heap[0][0] <= now and len(leased) < limit:
+            due_at, grant_id = heapq.heappop(heap)
+            if self._due.get(grant_id) != due_at:
+                continue
+            self._schedule(grant_id, provider, now + lease)
+            leased.append((grant_id, self._grants[grant_id]))
+        return leased
+
+
+class SQLiteTokenStore(TokenStore):
+    """File-backed store that several worker processes can share."""
+
+    def __init__(self, path: str):
+        self.db = SQLiteDatabase(
+            path,
+            "CREATE TABLE IF NOT EXISTS token_grants "
+            "(id TEXT PRIMARY KEY, provider TEXT NOT NULL, data TEXT NOT NULL, due_at REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS token_grants_due ON token_grants (provider, due_at)",
+        )
+
+    def _get(self, grant_id: str) -> TokenGrant | None:
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT data FROM token_grants WHERE id = ?", (grant_id,)).fetchone()
+        return TokenGrant(**json.loads(row[0])) if row else None
+
+    def _save(self, grant_id: str, grant: TokenGrant) -> None:
+        with self.db.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO token_grants (id, provider, data, due_at) VALUES (?, ?, ?, ?)",
+                (grant_id, grant.provider, json.dumps(asdict(grant)), grant.due_at),
+            )
+
+    def _update(self, grant_id: str, grant: TokenGrant) -> bool:
+        # The session may have been extended since the grant was read, keep the later expiry
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT data FROM token_grants WHERE id = ?", (grant_id,)).fetchone()
+            if row is None:
+                return False
+            grant.session_expires_at = max(grant.session_expires_at, json.loads(row[0])["session_expires_at"])
+            conn.execute(
+                "UPDATE token_grants SET data = ?, due_at = ? WHERE id = ?",
+                (json.dumps(asdict(grant)), grant.due_at, grant_id),
+            )
+        return True
+
+    def _delete(self, grant_id: str) -> None:
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM token_grants WHERE id = ?", (grant_id,))
+
+    def _pop(self, grant_id: str) -> TokenGrant | None:
+        # One statement, so of two concurrent logouts only one gets the grant
+        with self.db.connection() as conn:
+            row = conn.execute("DELETE FROM token_grants WHERE id = ? RETURNING data", (grant_id,)).fetchone()
+        return TokenGrant(**json.loads(row[0])) if row else None
+
+    def _extend(self, grant_id: str, session_expires_at: float) -> None:
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT data FROM token_grants WHERE id = ?", (grant_id,)).fetchone()
+            if row is None:
+                return
+            grant = TokenGrant(**json.loads(row[0]))
+            if session_expires_at > grant.session_expires_at:
+                grant.session_expires_at = session_expires_at
+                conn.execute(
+                    "UPDATE token_grants SET data = ?, due_at = ? WHERE id = ?",
+                    (json.dumps(asdict(grant)), grant.due_at, grant_id),
+                )
+
+    def _lease_due(self, provider: str, now: float, lease: float, limit: int) -> list[tuple[str, TokenGrant]]:
+        # Immediate transaction so two workers can't lease the same grants
+        with self.db.transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, data FROM token_grants WHERE provider = ? AND due_at <= ? ORDER BY due_at LIMIT ?",
+                (provider, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE token_grants SET due_at = ? WHERE id = ?",
+                [(now + lease, grant_id) for grant_id, _ in rows],
+            )
+        return [(grant_id, TokenGrant(**json.loads(data))) for grant_id, data in rows]
+
+    async def get(self, grant_id: str) -> TokenGrant | None:
+        return await self.db.run(self._get, grant_id)
+
+    async def save(self, grant_id: str, grant: TokenGrant) -> None:
+        await self.db.run(self._save, grant_id, grant)
+
+    async def update(self, grant_id: str, grant: TokenGrant) -> bool:
+        return await self.db.run(self._update, grant_id, grant)
+
+    async def delete(self, grant_id: str) -> None:
+        await self.db.run(self._delete, grant_id)
+
+    async def pop(self, grant_id: str) -> TokenGrant | None:
+        return await self.db.run(self._pop, grant_id)
+
+    async def extend(self, grant_id: str, session_expires_at: float) -> None:
+        await self.db.run(self._extend, grant_id, session_expires_at)
+
+    async def lease_due(self, provider: str, now: float, lease: float, limit: int) -> list[tuple[str, TokenGrant]]:
+        return await self.db.run(self._lease_due, provider, now, lease, limit)
+
+    async def close(self) -> None:
+        self.db.close()
+
+
+def create_token_store() -> TokenStore:
+    """Build the token store for the configured backend."""
+    if settings.TOKEN_STORE_BACKEND == "memory":
+        return MemoryTokenStore(max_entries=settings.TOKEN_STORE_MAX_ENTRIES)
+    if settings.TOKEN_STORE_BACKEND == "sqlite":
+        return SQLiteTokenStore(settings.TOKEN_STORE_SQLITE_PATH)
+    raise ValueError(f"Unknown token store backend: {settings.TOKEN_STORE_BACKEND}")
+
+
+token_store = create_token_store()
+
+# Refreshes in flight, keyed by grant ID
+refresh_flights = SingleFlight()
+
+_clients: dict[str, "OAuth20Base"] = {}
+_refresh_task: asyncio.Task | None = None
+
+
+async def save_grant(provider: str, client: "OAuth20Base", token_data: dict[str, Any]) -> str | None:
+    """Keep the tokens of a login if they can be refreshed or revoked later, and return the grant ID."""
+    # Only kept when it can be used, otherwise the scheduler would try to refresh it
+    refresh_token = token_data.get("refresh_token") if client.refresh_token_endpoint else None
+    revocable = settings.TOKEN_REVOKE_ON_LOGOUT and supports_revocation(provider, client)
+    if not refresh_token and not revocable:
+        return None
+    now = time.time()
+    grant = TokenGrant(
+        provider=provider,
+        access_token=token_data["access_token"],
+        refresh_token=refresh_token,
+        expires_at=now + float(token_data.get("expires_in") or _DEFAULT_EXPIRES_IN),
+        session_expires_at=now + settings.SESSION_MAX_AGE,
+        extra={key: token_data[key] for key in PROVIDERS[provider].userinfo_args if key in token_data},
+    )
+    grant_id = secrets.token_urlsafe(24)
+    await token_store.save(grant_id, grant)
+    return grant_id
+
+
+async def extend_session_grant(session: dict[str, Any], session_expires_at: float) -> None:
+    """Keep the grant of a renewed session for as long as the session now lasts."""
+    grant_id = session.get("grant")
+    if grant_id:
+        await token_store.extend(grant_id, session_expires_at)
+
+
+async def replace_grant(previous_grant_id: str) -> None:
+    """Drop the grant of an earlier login in the same session and revoke its tokens."""
+    grant = await token_store.pop(previous_grant_id)
+    if grant is not None:
+        enqueue_revocation(grant)
+
+
+async def _end_grant(grant_id: str) -> None:
+    """Drop a grant once its session has ended and revoke its tokens, as a logout would."""
+    grant = await token_store.get(grant_id)
+    if grant is None:
+        return
+    if grant.session_expires_at > time.time():
+        # The session was renewed after the grant was leased, wait for the new expiry
+        await token_store.update(grant_id, grant)
+        return
+    grant = await token_store.pop(grant_id)
+    if grant is not None:
+        enqueue_revocation(grant)
+
+
+async def _refresh(grant_id: str, grant: TokenGrant) -> None:
+    if grant.session_expires_at <= time.time() or not grant.refresh_token:
+        await _end_grant(grant_id)
+        return
+    client = _clients.get(grant.provider)
+    if client is None:
+        return
+
+    try:
+        with track_phase(grant.provider, "token_refresh"):
+            # Refresh tokens may rotate, so a refresh is not retried within the call
+            token_data = await guarded_call(grant.provider, lambda: client.refresh_token(grant.refresh_token))
+    except Exception as e:
+        if isinstance(e, CircuitOpenError) or is_transient(e):
+            # The lease runs out and the grant is picked up again
+            OAUTH_TOKEN_REFRESHES.labels(grant.provider, "retry").inc()
+        else:
+            # Revoked or expired refresh token, the user has to log in again
+            OAUTH_TOKEN_REFRESHES.labels(grant.provider, "failure").inc()
+            await token_store.delete(grant_id)
+        return
+
+    grant.access_token = token_data["access_token"]
+    grant.refresh_token = token_data.get("refresh_token") or grant.refresh_token
+    grant.expires_at = time.time() + float(token_data.get("expires_in") or _DEFAULT_EXPIRES_IN)
+    if not await token_store.update(grant_id, grant):
+        # Logged out while the refresh was running, the new tokens must not outlive the session
+        enqueue_revocation(grant)
+    OAUTH_TOKEN_REFRESHES.labels(grant.provider, "success").inc()
+
+
+async def refresh_grant(grant_id: str, grant: TokenGrant) -> None:
+    """Refresh a grant, joining a refresh of the same grant that is already running."""
+    await refresh_flights.do(grant_id, lambda: _refresh(grant_id, grant))
+
+
+async def _refresh_provider(provider: str) -> None:
+    """Refresh one batch of due grants of a provider, a few at a time."""
+    grants = await token_store.lease_due(
+        provider,
+        time.time(),
+        lease=settings.TOKEN_REFRESH_LEASE,
+        limit=settings.TOKEN_REFRESH_BATCH_SIZE,
+    )
+    semaphore = asyncio.Semaphore(settings.TOKEN_REFRESH_CONCURRENCY)
+
+    async def refresh(grant_id: str, grant: TokenGrant) -> None:
+        async with semaphore:
+            await refresh_grant(grant_id, grant)
+
+    await asyncio.gather(*(refresh(grant_id, grant) for grant_id, grant in grants))
+
+
+async def _refresh_loop() -> None:
+    while True:
+        results = await asyncio.gather(*(_refresh_provider(name) for name in _clients), return_exceptions=True)
+        for name, result in zip(_clients, results):
+            if isinstance(result, Exception):
+                log_event("Token refresh batch failed", provider=name, phase="token_refresh", error=result)
+        await asyncio.sleep(settings.TOKEN_REFRESH_INTERVAL)
+
+
+async def start_token_refresher(provider_clients: dict[str, "OAuth20Base"]) -> None:
+    """Start refreshing grants of providers that support refresh tokens, and expiring revocable ones."""
+    global _refresh_task
+    _clients.update(
+        {
+            name: client
+            for name, client in provider_clients.items()
+            if client.refresh_token_endpoint or supports_revocation(name, client)
+        }
+    )
+    if settings.TOKEN_REFRESH_ENABLED and _clients:
+        _refresh_task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_token_refresher() -> None:
+    """Stop the scheduler."""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+    _clients.clear()
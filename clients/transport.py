@@ -0,0 +1,72 @@
+"""Shared HTTP transport for OAuth provider clients.
+
+Provider clients send their requests through ``provider_request`` (see
+``clients.pooled``), so every call reuses the pooled keep-alive connections.
+"""
+from typing import Any, Iterable
+
+import httpx
+
+from config import settings
+
+# Process-wide connection pool, created and closed by the app lifespan
+_http_client: httpx.AsyncClient | None = None
+
+# Provider key -> timeout, for providers with an HTTP_PROVIDER_TIMEOUTS entry
+_provider_timeouts: dict[str, httpx.Timeout] = {}
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the shared keep-alive client from settings."""
+    return httpx.AsyncClient(
+        http2=settings.HTTP2,
+        timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared client, failing loudly outside the app lifespan."""
+    if _http_client is None:
+        raise RuntimeError("HTTP client is not initialized, is the app lifespan running?")
+    return _http_client
+
+
+def register_provider(name: str) -> None:
+    """Give a provider's requests their own timeout.
+
+    Timeouts are per provider, not per host: WeChat MP and Open share
+    api.weixin.qq.com, and in mock mode every provider shares one host.
+    """
+    seconds = settings.HTTP_PROVIDER_TIMEOUTS.get(name)
+    if seconds is not None:
+        _provider_timeouts[name] = httpx.Timeout(seconds, connect=min(seconds, settings.HTTP_CONNECT_TIMEOUT))
+
+
+async def provider_request(provider: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """Send a request to a provider over the shared pool, with the provider's timeout."""
+    client = get_http_client()
+    kwargs.setdefault("timeout", _provider_timeouts.get(provider, client.timeout))
+    return await client.request(method, url, **kwargs)
+
+
+def open_http_client(provider_names: Iterable[str]) -> httpx.AsyncClient:
+    """Create the shared client and the timeouts of the configured providers."""
+    global _http_client
+    _http_client = create_http_client()
+    for name in provider_names:
+        register_provider(name)
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close pooled connections."""
+    global _http_client
+    _provider_timeouts.clear()
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -0,0 +1,165 @@
+"""Fetching user profiles after the token exchange.
+
+Besides the userinfo call, a provider can declare enrichments: independent
+follow-up requests that run concurrently with it, each under its own
+deadline. Optional enrichments that fail or run late are left out of the
+profile instead of failing the login, and fallbacks that the userinfo
+response turns out not to need are cancelled.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from cache import TTLCache
+from config import settings
+from metrics import OAUTH_USERINFO_CACHE, track_phase
+
+from .oidc import claims_to_userinfo, verify_id_token
+from .registry import Provider
+from .resilience import guarded_call
+from .transport import provider_request
+
+if TYPE_CHECKING:
+    from fastapi_oauth20.oauth20 import OAuth20Base
+
+# Opt-in cache of user profiles keyed by (provider, subject)
+userinfo_cache: TTLCache | None = None
+
+if settings.USERINFO_CACHE_TTL > 0:
+    userinfo_cache = TTLCache(max_entries=settings.USERINFO_CACHE_MAX_ENTRIES, ttl=settings.USERINFO_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class Enrichment:
+    """A profile request that runs alongside userinfo."""
+
+    name: str
+    fetch: Callable[["OAuth20Base", dict[str, Any]], Awaitable[Any]]
+    # Folds the fetched data into the userinfo payload
+    merge: Callable[[dict[str, Any], Any], None]
+    deadline: float = settings.USERINFO_ENRICHMENT_DEADLINE
+    # A failing required enrichment fails the login
+    optional: bool = True
+    # For a fallback: whether the userinfo payload still needs it, if not it is cancelled and its result ignored
+    needed: Callable[[dict[str, Any]], bool] | None = None
+
+
+async def _get_json(provider: str, client: "OAuth20Base", url: str, access_token: str) -> Any:
+    response = await provider_request(
+        provider, "GET", url, headers={**client.request_headers, "Authorization": f"Bearer {access_token}"}
+    )
+    client.raise_httpx_oauth20_errors(response)
+    return response.json()
+
+
+async def _github_user(client: "OAuth20Base", token_data: dict[str, Any]) -> dict[str, Any]:
+    # The library's get_userinfo fetches /user/emails only after /user, that runs concurrently here instead
+    return await _get_json("github", client, client.userinfo_endpoint, token_data["access_token"])
+
+
+async def _github_emails(client: "OAuth20Base", token_data: dict[str, Any]) -> list[dict[str, Any]]:
+    return await _get_json("github", client, f"{client.userinfo_endpoint}/emails", token_data["access_token"])
+
+
+def _github_email_missing(user_info: dict[str, Any]) -> bool:
+    return user_info.get("email") is None
+
+
+def _merge_github_emails(user_info: dict[str, Any], emails: list[dict[str, Any]]) -> None:
+    if _github_email_missing(user_info) and emails:
+        user_info["email"] = next((email["email"] for email in emails if email.get("primary")), emails[0]["email"])
+
+
+# Provider key -> userinfo call replacing the client's get_userinfo
+USERINFO_FETCHERS: dict[str, Callable[["OAuth20Base", dict[str, Any]], Awaitable[dict[str, Any]]]] = {
+    "github": _github_user,
+}
+
+# Provider key -> requests run concurrently with the userinfo call. Only GitHub has one so far: Feishu's
+# userinfo already carries the fields of the requested contact scopes and WeChat's /sns/userinfo the whole
+# profile including unionid, their other user endpoints need an app or tenant token rather than the user's
+ENRICHMENTS: dict[str, tuple[Enrichment, ...]] = {
+    # Private emails are missing from /user. Started with it, so a private email costs no extra round trip,
+    # and cancelled when /user has a public one
+    "github": (Enrichment("emails", _github_emails, _merge_github_emails, needed=_github_email_missing),),
+}
+
+
+async def _enrich(spec: Provider, client: "OAuth20Base", token_data: dict[str, Any], enrichment: Enrichment) -> Any:
+    with track_phase(spec.name, f"enrich_{enrichment.name}"):
+        return await asyncio.wait_for(enrichment.fetch(client, token_data), timeout=enrichment.deadline)
+
+
+async def request_userinfo(spec: Provider, client: "OAuth20Base", token_data: dict[str, Any]) -> dict[str, Any]:
+    """Call userinfo and the provider's enrichments concurrently and merge the results."""
+    fetch = USERINFO_FETCHERS.get(spec.name)
+    if fetch is None:
+        args = [token_data[key] for key in spec.userinfo_args]
+
+        async def fetch(client: "OAuth20Base", token_data: dict[str, Any]) -> dict[str, Any]:
+            return await client.get_userinfo(token_data["access_token"], *args)
+
+    enrichments = ENRICHMENTS.get(spec.name, ())
+    tasks = [asyncio.ensure_future(_enrich(spec, client, token_data, enrichment)) for enrichment in enrichments]
+    try:
+        with track_phase(spec.name, "userinfo"):
+            user_info = await guarded_call(spec.name, lambda: fetch(client, token_data), idempotent=True)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    skipped = [enrichment.needed is not None and not enrichment.needed(user_info) for enrichment in enrichments]
+    for task, skip in zip(tasks, skipped):
+        if skip:
+            task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for enrichment, skip, result in zip(enrichments, skipped, results):
+        if skip:
+            continue
+        if isinstance(result, BaseException):
+            if not enrichment.optional:
+                raise result
+            continue
+        enrichment.merge(user_info, result)
+    return user_info
+
+
+def userinfo_cache_key(spec: Provider, token_data: dict[str, Any]) -> tuple[str, str] | None:
+    """Key a profile by the stable subject in the token response, None when the provider has none.
+
+    Access tokens are new on every login, so they can't key a cache.
+    """
+    subject = token_data.get(spec.subject_key) if spec.subject_key else None
+    if not subject:
+        return None
+    return spec.name, str(subject)
+
+
+async def fetch_userinfo(spec: Provider, client: "OAuth20Base", token_data: dict[str, Any]) -> dict[str, Any]:
+    """Get the user's profile for a token response.
+
+    A verifiable OIDC ID token is used as is, otherwise the profile comes from
+    the cache when possible and from the provider's userinfo endpoint.
+    """
+    id_token = token_data.get("id_token")
+    if id_token and spec.oidc_issuer:
+        with track_phase(spec.name, "id_token"):
+            claims = await verify_id_token(spec.name, client, id_token)
+        if claims is not None:
+            return claims_to_userinfo(claims)
+
+    key = userinfo_cache_key(spec, token_data) if userinfo_cache is not None else None
+    if key is not None:
+        user_info = userinfo_cache.get(key)
+        if user_info is not None:
+            OAUTH_USERINFO_CACHE.labels(spec.name, "hit").inc()
+            return user_info
+        OAUTH_USERINFO_CACHE.labels(spec.name, "miss").inc()
+
+    user_info = await request_userinfo(spec, client, token_data)
+
+    if key is not None:
+        userinfo_cache.set(key, user_info)
+    return user_info
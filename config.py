@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -16,44 +17,157 @@ class Settings(BaseSettings):
     APP_NAME: str = "FastAPI OAuth20 Demo"
     APP_URL: str = "http://127.0.0.1:8000"
 
+    # JSON encoding: orjson when installed (auto), or force orjson / stdlib
+    JSON_BACKEND: Literal["auto", "orjson", "stdlib"] = "auto"
+
+    # Server (server.py): 0 workers means one per core
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE_TIMEOUT: int = 5
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_LIMIT_CONCURRENCY: int = 0
+    SERVER_FORWARDED_ALLOW_IPS: str = "127.0.0.1"
+    SERVER_ACCESS_LOG: bool = False
+
+    # Logging: JSON lines on stdout, successful events sampled
+    LOG_LEVEL: str = "INFO"
+    LOG_SUCCESS_SAMPLE_RATE: float = 0.1
+    LOG_QUEUE_SIZE: int = 10000
+
+    # Outbound HTTP
+    HTTP2: bool = False
+    HTTP_TIMEOUT: float = 10.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_PROVIDER_TIMEOUTS: dict[str, float] = {}
+
+    # Health: connections opened per provider host in the background at startup (/healthz is 503 until then,
+    # at most HEALTH_WARMUP_TIMEOUT), and the probe interval (0 disables)
+    HEALTH_WARMUP_CONNECTIONS: int = 2
+    HEALTH_WARMUP_TIMEOUT: float = 5.0
+    HEALTH_PROBE_INTERVAL: float = 20.0
+    HEALTH_PROBE_TIMEOUT: float = 3.0
+
+    # Admin: bearer token for /admin/profile, the endpoint is off while empty
+    ADMIN_TOKEN: str = ""
+    PROFILER_INTERVAL: float = 0.005
+    PROFILER_MAX_SECONDS: float = 60.0
+
+    # Provider resilience
+    PROVIDER_DEADLINE: float = 8.0
+    PROVIDER_RETRIES: int = 2
+    PROVIDER_RETRY_BACKOFF: float = 0.1
+    PROVIDER_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    PROVIDER_CIRCUIT_RECOVERY_TIMEOUT: float = 30.0
+
+    # Rate limiting of authorize and callback requests, rates in requests per second (0 disables). The IP
+    # bucket is generous, since clients behind one NAT share it; behind a reverse proxy, its address must be
+    # in SERVER_FORWARDED_ALLOW_IPS, otherwise every client is seen as the proxy
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: Literal["memory", "sqlite"] = "memory"
+    RATE_LIMIT_SQLITE_PATH: str = "ratelimit.db"
+    RATE_LIMIT_MAX_ENTRIES: int = 100000
+    RATE_LIMIT_IP_RATE: float = 5.0
+    RATE_LIMIT_IP_BURST: int = 100
+    RATE_LIMIT_PROVIDER_RATE: float = 50.0
+    RATE_LIMIT_PROVIDER_BURST: int = 100
+    RATE_LIMIT_PROVIDER_RATES: dict[str, float] = {}
+    RATE_LIMIT_PROVIDER_CONCURRENCY: int = 50
+
+    # OAuth state store, which also keeps the PKCE verifier of providers that support PKCE
+    OAUTH_PKCE: bool = True
+    OAUTH_STATE_BACKEND: Literal["memory", "sqlite"] = "memory"
+    OAUTH_STATE_TTL: int = 600
+    OAUTH_STATE_MAX_ENTRIES: int = 100000
+    OAUTH_STATE_SQLITE_PATH: str = "oauth_state.db"
+
+    # Userinfo cache, disabled when the TTL is 0; only used for providers with a stable user ID in the
+    # token response (WeChat's openid), since others can only be keyed by the per-login access token
+    USERINFO_CACHE_TTL: int = 0
+    USERINFO_CACHE_MAX_ENTRIES: int = 10000
+    # Deadline of each follow-up profile request (e.g. GitHub emails) run alongside userinfo
+    USERINFO_ENRICHMENT_DEADLINE: float = 2.0
+
+    # OpenID Connect: verify ID tokens locally instead of calling userinfo (needs the oidc extra)
+    OIDC_ENABLED: bool = True
+    OIDC_JWKS_TTL: int = 3600
+
+    # Token refresh: grants are kept server-side and renewed shortly before they expire
+    TOKEN_REFRESH_ENABLED: bool = True
+    TOKEN_REFRESH_MARGIN: int = 300
+    TOKEN_REFRESH_INTERVAL: float = 30.0
+    TOKEN_REFRESH_BATCH_SIZE: int = 50
+    TOKEN_REFRESH_CONCURRENCY: int = 5
+    TOKEN_REFRESH_LEASE: float = 60.0
+    TOKEN_STORE_BACKEND: Literal["memory", "sqlite"] = "memory"
+    TOKEN_STORE_MAX_ENTRIES: int = 10000
+    TOKEN_STORE_SQLITE_PATH: str = "tokens.db"
+
+    # Token revocation on logout, done in the background with retries
+    TOKEN_REVOKE_ON_LOGOUT: bool = True
+    TOKEN_REVOKE_QUEUE_SIZE: int = 10000
+    TOKEN_REVOKE_BATCH_SIZE: int = 50
+    TOKEN_REVOKE_CONCURRENCY: int = 5
+    TOKEN_REVOKE_RETRIES: int = 3
+    TOKEN_REVOKE_BACKOFF: float = 1.0
+    TOKEN_REVOKE_DRAIN_TIMEOUT: float = 5.0
+
+    # Keep the full provider payload in the user profile, not just the normalized fields
+    USER_PROFILE_KEEP_RAW: bool = False
+
+    # Session
+    SESSION_BACKEND: Literal["cookie", "memory", "sqlite"] = "memory"
+    SESSION_SECRET_KEY: str = "change-this-in-production"
+    SESSION_COOKIE: str = "session"
+    SESSION_MAX_AGE: int = 3600
+    SESSION_MAX_ENTRIES: int = 10000
+    SESSION_SQLITE_PATH: str = "sessions.db"
+
+    # Point every provider at benchmarks/mock_provider.py, e.g. http://127.0.0.1:9000
+    OAUTH_MOCK_PROVIDER_URL: str = ""
+
     # GitHub OAuth
-    GITHUB_CLIENT_ID: str
-    GITHUB_CLIENT_SECRET: str
+    GITHUB_CLIENT_ID: str = ""
+    GITHUB_CLIENT_SECRET: str = ""
     GITHUB_REDIRECT_URI: str = "http://127.0.0.1:8000/api/v1/oauth2/github/callback"
 
     # Google OAuth
-    GOOGLE_CLIENT_ID: str
-    GOOGLE_CLIENT_SECRET: str
+    GOOGLE_CLIENT_ID: str = ""
+    GOOGLE_CLIENT_SECRET: str = ""
     GOOGLE_REDIRECT_URI: str = "http://127.0.0.1:8000/api/v1/oauth2/google/callback"
 
     # FeiShu OAuth
-    FEISHU_CLIENT_ID: str
-    FEISHU_CLIENT_SECRET: str
+    FEISHU_CLIENT_ID: str = ""
+    FEISHU_CLIENT_SECRET: str = ""
     FEISHU_REDIRECT_URI: str = "http://127.0.0.1:8000/api/v1/oauth2/feishu/callback"
 
     # Gitee OAuth
-    GITEE_CLIENT_ID: str
-    GITEE_CLIENT_SECRET: str
+    GITEE_CLIENT_ID: str = ""
+    GITEE_CLIENT_SECRET: str = ""
     GITEE_REDIRECT_URI: str = "http://127.0.0.1:8000/api/v1/oauth2/gitee/callback"
 
     # Linux.do OAuth
-    LINUXDO_CLIENT_ID: str
-    LINUXDO_CLIENT_SECRET: str
+    LINUXDO_CLIENT_ID: str = ""
+    LINUXDO_CLIENT_SECRET: str = ""
     LINUXDO_REDIRECT_URI: str = "http://127.0.0.1:8000/api/v1/oauth2/linux-do/callback"
 
     # OSChina OAuth
-    OSCHINA_CLIENT_ID: str
-    OSCHINA_CLIENT_SECRET: str
+    OSCHINA_CLIENT_ID: str = ""
+    OSCHINA_CLIENT_SECRET: str = ""
     OSCHINA_REDIRECT_URI: str = "http://127.0.0.1:8000/api/v1/oauth2/oschina/callback"
 
     # WeChat Mini Program OAuth
-    WECHAT_MP_CLIENT_ID: str
-    WECHAT_MP_CLIENT_SECRET: str
+    WECHAT_MP_CLIENT_ID: str = ""
+    WECHAT_MP_CLIENT_SECRET: str = ""
     WECHAT_MP_REDIRECT_URI: str = "http://127.0.0.1:8000/api/v1/oauth2/wechat_mp/callback"
 
     # WeChat Open Platform OAuth
-    WECHAT_OPEN_CLIENT_ID: str
-    WECHAT_OPEN_CLIENT_SECRET: str
+    WECHAT_OPEN_CLIENT_ID: str = ""
+    WECHAT_OPEN_CLIENT_SECRET: str = ""
     WECHAT_OPEN_REDIRECT_URI: str = "http://127.0.0.1:8000/api/v1/oauth2/wechat_open/callback"
 
 
@@ -0,0 +1,56 @@
+"""JSON encoding for API responses, session payloads and templates.
+
+Uses orjson when it is installed (``uv sync --extra fastjson``) and the
+stdlib ``json`` module otherwise; ``JSON_BACKEND`` forces either one. Both
+produce the same compact UTF-8 output as Starlette's ``JSONResponse``.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if settings.JSON_BACKEND == "orjson" and orjson is None:
+    raise RuntimeError("JSON_BACKEND=orjson but orjson is not installed")
+
+BACKEND = "orjson" if orjson is not None and settings.JSON_BACKEND != "stdlib" else "stdlib"
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _stdlib_dumps_str(obj: Any, *, indent: int | None = None, sort_keys: bool = False) -> str:
+    return json.dumps(obj, ensure_ascii=False, indent=indent, sort_keys=sort_keys)
+
+
+def _orjson_dumps_str(obj: Any, *, indent: int | None = None, sort_keys: bool = False) -> str:
+    if indent not in (None, 2):
+        # orjson only indents by two spaces
+        return _stdlib_dumps_str(obj, indent=indent, sort_keys=sort_keys)
+    option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return orjson.dumps(obj, option=option).decode("utf-8")
+
+
+if BACKEND == "orjson":
+    dumps = orjson.dumps
+    dumps_str = _orjson_dumps_str
+    loads = orjson.loads
+else:
+    dumps = _stdlib_dumps
+    dumps_str = _stdlib_dumps_str
+    loads = json.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the configured JSON backend."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
@@ -0,0 +1,124 @@
+"""Structured, queue-backed logging for OAuth events.
+
+Records are put on a bounded queue on the event loop and formatted as JSON
+and written by a listener thread, so slow stdout never stalls request
+handling. Successful events are sampled, errors are always kept; when the
+queue is full records are dropped rather than waited on.
+"""
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from config import settings
+
+logger = logging.getLogger("oauth")
+
+# Record attributes copied into the JSON output when set
+_FIELDS = ("provider", "phase", "duration_ms", "result", "error", "detail")
+
+_listener: QueueListener | None = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for name in _FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        return json.dumps(data, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks and does no formatting on the caller's thread."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The JSON formatter runs in the listener, only the message is merged here
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room instead of failing when the queue is full at shutdown
+        self.queue.put(self._sentinel)
+
+
+def log_event(
+    event: str,
+    *,
+    provider: str,
+    phase: str,
+    started: float | None = None,
+    result: str | None = None,
+    error: BaseException | None = None,
+) -> None:
+    """Log the outcome of an OAuth phase; successes are kept at LOG_SUCCESS_SAMPLE_RATE."""
+    if error is None:
+        if random.random() >= settings.LOG_SUCCESS_SAMPLE_RATE or not logger.isEnabledFor(logging.INFO):
+            return
+        level = logging.INFO
+    else:
+        level = logging.WARNING
+    logger.log(
+        level,
+        event,
+        extra={
+            "provider": provider,
+            "phase": phase,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2) if started is not None else None,
+            "result": result,
+            "error": type(error).__name__ if error is not None else None,
+            "detail": str(error)[:200] if error is not None else None,
+        },
+    )
+
+
+def start_logging() -> None:
+    """Route the ``oauth`` logger through the queue and start the writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JSONFormatter())
+    handler = DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    logger.addHandler(handler)
+    logger.setLevel(settings.LOG_LEVEL)
+    logger.propagate = False
+    _listener = _Listener(handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is None:
+        return
+    for handler in list(logger.handlers):
+        if isinstance(handler, DroppingQueueHandler):
+            logger.removeHandler(handler)
+    logger.propagate = True
+    _listener.stop()
+    _listener = None
@@ -1,29 +1,79 @@
+import hmac
 from contextlib import asynccontextmanager
+from functools import lru_cache
 from typing import AsyncGenerator
 
-from fastapi import FastAPI, Request, status
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Query, Request, status
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
-from starlette.middleware.sessions import SessionMiddleware
+
+from assets import STATIC_DIRECTORY, ImmutableStaticFiles, static_url
 
 from clients import (
-    github_router,
-    google_router,
-    feishu_router,
-    gitee_router,
-    linuxdo_router,
-    oschina_router,
-    wechat_mp_router,
-    wechat_open_router,
+    PROVIDERS,
+    PROVIDERS_BY_SLUG,
+    UserProfile,
+    close_http_client,
+    compile_authorize_urls,
+    enqueue_revocation,
+    extend_session_grant,
+    health_snapshot,
+    open_http_client,
+    provider_clients,
+    router as oauth2_router,
+    start_health,
+    start_oidc,
+    start_revoker,
+    start_token_refresher,
+    state_store,
+    stop_health,
+    stop_oidc,
+    stop_revoker,
+    stop_token_refresher,
+    token_store,
 )
 from config import settings
+from fastjson import FastJSONResponse, dumps, dumps_str
+from logs import start_logging, stop_logging
+from metrics import render_metrics
+from profiler import is_profiling, profile_app
+from ratelimit import RateLimitMiddleware, create_rate_limit_backend
+from responses import PrecompressedBody, cached_response, make_etag
+from sessions import (
+    FastJSONSessionMiddleware,
+    PathScopedMiddleware,
+    ServerSessionMiddleware,
+    create_session_store,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Lifespan context manager."""
-    yield
+    start_logging()
+    get_providers_payload()
+    get_anonymous_index()
+    await compile_authorize_urls(provider_clients)
+    open_http_client(provider_clients)
+    await start_health(provider_clients)
+    await start_oidc(provider_clients)
+    await start_token_refresher(provider_clients)
+    await start_revoker(provider_clients)
+    try:
+        yield
+    finally:
+        await stop_revoker()
+        await stop_token_refresher()
+        await stop_health()
+        await stop_oidc()
+        await close_http_client()
+        await state_store.close()
+        await token_store.close()
+        if session_store is not None:
+            await session_store.close()
+        if rate_limit_backend is not None:
+            await rate_limit_backend.close()
+        stop_logging()
 
 
 # Create FastAPI app
@@ -32,100 +82,206 @@ app = FastAPI(
     description="Demo application showing OAuth2 integration with multiple providers",
     version="0.0.1",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
-# Add session middleware
-app.add_middleware(
-    SessionMiddleware,
-    secret_key="change-this-in-production",
-    max_age=3600,
-)
+# Add session middleware, only for the routes that read or write the session
+SESSION_PATHS = r"^/(|logout|api/user|api/v1/oauth2/[^/]+/callback)$"
+session_store = None
+
+if settings.SESSION_BACKEND == "cookie":
+    app.add_middleware(
+        PathScopedMiddleware,
+        middleware=FastJSONSessionMiddleware,
+        paths=SESSION_PATHS,
+        secret_key=settings.SESSION_SECRET_KEY,
+        session_cookie=settings.SESSION_COOKIE,
+        max_age=settings.SESSION_MAX_AGE,
+        on_renew=extend_session_grant,
+    )
+else:
+    session_store = create_session_store(
+        settings.SESSION_BACKEND,
+        sqlite_path=settings.SESSION_SQLITE_PATH,
+        max_entries=settings.SESSION_MAX_ENTRIES,
+    )
+    app.add_middleware(
+        PathScopedMiddleware,
+        middleware=ServerSessionMiddleware,
+        paths=SESSION_PATHS,
+        store=session_store,
+        session_cookie=settings.SESSION_COOKIE,
+        max_age=settings.SESSION_MAX_AGE,
+        on_renew=extend_session_grant,
+    )
 
-# Include OAuth client routers
-app.include_router(github_router, tags=["GitHub OAuth"])
-app.include_router(google_router, tags=["Google OAuth"])
-app.include_router(feishu_router, tags=["FeiShu OAuth"])
-app.include_router(gitee_router, tags=["Gitee OAuth"])
-app.include_router(linuxdo_router, tags=["LinuxDo OAuth"])
-app.include_router(oschina_router, tags=["OSChina OAuth"])
-app.include_router(wechat_mp_router, tags=["WeChat MP OAuth"])
-app.include_router(wechat_open_router, tags=["WeChat Open OAuth"])
+# Reject abusive authorize/callback traffic before it reaches the session or a provider
+rate_limit_backend = None
+
+if settings.RATE_LIMIT_ENABLED:
+    rate_limit_backend = create_rate_limit_backend(
+        settings.RATE_LIMIT_BACKEND,
+        sqlite_path=settings.RATE_LIMIT_SQLITE_PATH,
+        max_entries=settings.RATE_LIMIT_MAX_ENTRIES,
+    )
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=rate_limit_backend,
+        provider_names={slug: provider.name for slug, provider in PROVIDERS_BY_SLUG.items()},
+        ip_rate=settings.RATE_LIMIT_IP_RATE,
+        ip_burst=settings.RATE_LIMIT_IP_BURST,
+        provider_rate=settings.RATE_LIMIT_PROVIDER_RATE,
+        provider_burst=settings.RATE_LIMIT_PROVIDER_BURST,
+        provider_rates=settings.RATE_LIMIT_PROVIDER_RATES,
+        provider_concurrency=settings.RATE_LIMIT_PROVIDER_CONCURRENCY,
+    )
+
+# Include OAuth client routes
+app.include_router(oauth2_router, tags=["OAuth"])
 
 # Mount static files and templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", ImmutableStaticFiles(directory=STATIC_DIRECTORY), name="static")
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["static_url"] = static_url
+templates.env.policies["json.dumps_function"] = dumps_str
 
 
+@lru_cache
 def get_enabled_providers() -> dict[str, bool]:
-    """Get dictionary of enabled OAuth providers."""
-    return {
-        "github": bool(settings.GITHUB_CLIENT_ID and settings.GITHUB_CLIENT_SECRET),
-        "google": bool(settings.GOOGLE_CLIENT_ID and settings.GOOGLE_CLIENT_SECRET),
-        "feishu": bool(settings.FEISHU_CLIENT_ID and settings.FEISHU_CLIENT_SECRET),
-        "gitee": bool(settings.GITEE_CLIENT_ID and settings.GITEE_CLIENT_SECRET),
-        "linuxdo": bool(settings.LINUXDO_CLIENT_ID and settings.LINUXDO_CLIENT_SECRET),
-        "oschina": bool(settings.OSCHINA_CLIENT_ID and settings.OSCHINA_CLIENT_SECRET),
-        "wechat_mp": bool(settings.WECHAT_MP_CLIENT_ID and settings.WECHAT_MP_CLIENT_SECRET),
-        "wechat_open": bool(settings.WECHAT_OPEN_CLIENT_ID and settings.WECHAT_OPEN_CLIENT_SECRET),
-    }
+    """Get dictionary of enabled OAuth providers, fixed for the life of the process."""
+    return {name: provider.enabled for name, provider in PROVIDERS.items()}
+
+
+@lru_cache
+def get_providers_payload() -> tuple[bytes, str]:
+    """Get the pre-encoded /api/providers body and its ETag."""
+    enabled = [k for k, v in get_enabled_providers().items() if v]
+    body = dumps({"providers": enabled, "count": len(enabled)})
+    return body, make_etag(body)
+
+
+@lru_cache
+def get_active_providers() -> dict[str, bool]:
+    """Get only the enabled OAuth providers, as passed to the index template."""
+    return {k: v for k, v in get_enabled_providers().items() if v}
+
+
+@lru_cache
+def get_anonymous_index() -> PrecompressedBody:
+    """Render the home page for anonymous visitors without errors once."""
+    request = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []})
+    html = templates.get_template("index.html").render(
+        request=request,
+        providers=get_active_providers(),
+        user=None,
+    )
+    return PrecompressedBody(html.encode(), media_type="text/html; charset=utf-8")
 
 
 @app.get("/", response_class=HTMLResponse)
-async def index(request: Request) -> HTMLResponse:
+async def index(request: Request) -> Response:
     """Home page with login buttons."""
-    providers = {k: v for k, v in get_enabled_providers().items() if v}
+    user = UserProfile.from_session(request.session.get("user"))
+    if not user and not request.query_params.get("error"):
+        return get_anonymous_index().response(request, cache_control="private, no-cache")
+
     return templates.TemplateResponse(
         request=request,
         name="index.html",
         context={
-            "providers": providers,
-            "user": request.session.get("user"),
+            "providers": get_active_providers(),
+            "user": user,
         },
     )
 
 
 @app.get("/logout")
 async def logout(request: Request) -> RedirectResponse:
-    """Log out the current user."""
+    """Log out the current user; provider tokens are revoked in the background."""
+    grant_id = request.session.get("grant")
+    if grant_id:
+        grant = await token_store.pop(grant_id)
+        if grant is not None:
+            enqueue_revocation(grant)
     request.session.clear()
     return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
 
 
 @app.get("/api/user")
-async def get_user(request: Request) -> JSONResponse:
+async def get_user(request: Request) -> FastJSONResponse:
     """Get current user info as JSON."""
-    user = request.session.get("user")
+    user = UserProfile.from_session(request.session.get("user"))
     if not user:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_401_UNAUTHORIZED,
             content={"error": "Not authenticated"},
         )
-    return JSONResponse(content=user)
+    return FastJSONResponse(content=user.to_dict())
 
 
 @app.get("/api/providers")
-async def get_providers() -> JSONResponse:
+async def get_providers(request: Request) -> Response:
     """Get list of available OAuth providers."""
-    providers = get_enabled_providers()
-    enabled = [k for k, v in providers.items() if v]
-    return JSONResponse(
-        content={
-            "providers": enabled,
-            "count": len(enabled),
-        },
+    body, etag = get_providers_payload()
+    return cached_response(
+        request,
+        body,
+        etag=etag,
+        media_type="application/json",
+        cache_control="public, max-age=60",
     )
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Export metrics in Prometheus text format."""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/healthz", include_in_schema=False)
+async def get_health() -> FastJSONResponse:
+    """Readiness: 503 until provider connections are warmed up, then per-provider reachability and RTT."""
+    health = health_snapshot()
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE if health["status"] == "starting" else status.HTTP_200_OK
+    return FastJSONResponse(status_code=status_code, content=health, headers={"Cache-Control": "no-store"})
+
+
+@app.get("/admin/profile", include_in_schema=False)
+async def get_profile(
+    request: Request, seconds: float = 10.0, output_format: str = Query("collapsed", alias="format")
+) -> Response:
+    """Sample this worker for ``seconds`` and return stacks grouped by route, as collapsed text or speedscope JSON."""
+    authorization = request.headers.get("authorization", "")
+    if not settings.ADMIN_TOKEN:
+        return FastJSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": "Not Found"})
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {settings.ADMIN_TOKEN}".encode()):
+        return FastJSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"error": "Not authorized"})
+    if output_format not in ("collapsed", "speedscope") or not 0 < seconds <= settings.PROFILER_MAX_SECONDS:
+        return FastJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"error": f"format is collapsed or speedscope, seconds at most {settings.PROFILER_MAX_SECONDS}"},
+        )
+    if is_profiling():
+        return FastJSONResponse(status_code=status.HTTP_409_CONFLICT, content={"error": "A profile is already running"})
+
+    profiler = await profile_app(request.app, seconds, settings.PROFILER_INTERVAL)
+    headers = {"Cache-Control": "no-store"}
+    if output_format == "speedscope":
+        headers["Content-Disposition"] = 'attachment; filename="profile.speedscope.json"'
+        return FastJSONResponse(content=profiler.speedscope(), headers=headers)
+    return PlainTextResponse(profiler.collapsed(), headers=headers)
+
+
 @app.exception_handler(Exception)
-async def global_exception_handler(request: Request, exc: Exception) -> JSONResponse:
+async def global_exception_handler(request: Request, exc: Exception) -> FastJSONResponse:
     """Global exception handler."""
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"error": str(exc)},
     )
 
 
 if __name__ == "__main__":
-    import uvicorn
+    from server import run
 
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    run()
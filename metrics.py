@@ -0,0 +1,235 @@
+"""In-process metrics exported in Prometheus text format.
+
+Metrics are only updated from the event loop thread and never across an
+``await``, so plain dict and float updates are safe without locks.
+"""
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Iterator
+
+from logs import log_event
+
+_registry: list["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric(ABC):
+    """Base class for a labelled metric family."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], object] = {}
+        _registry.append(self)
+
+    @abstractmethod
+    def _new_child(self) -> object:
+        ...
+
+    def labels(self, *values: str):
+        """Get the child metric for the given label values."""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in self._children.items():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: tuple[str, ...], child) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+
+    type = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    type = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+    """Distribution of observations over fixed buckets."""
+
+    type = "histogram"
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, values: tuple[str, ...], child: _HistogramValue) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), child.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _format_labels(self.labelnames, values, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+def render_metrics() -> str:
+    """Render every registered metric in Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# OAuth provider metrics
+OAUTH_PHASE_SECONDS = Histogram(
+    "oauth_phase_duration_seconds",
+    "Duration of OAuth provider phases.",
+    ("provider", "phase"),
+)
+OAUTH_PHASE_ERRORS = Counter(
+    "oauth_phase_errors_total",
+    "OAuth provider phases that raised an error.",
+    ("provider", "phase"),
+)
+OAUTH_PHASE_IN_FLIGHT = Gauge(
+    "oauth_phase_in_flight",
+    "OAuth provider phases currently running.",
+    ("provider", "phase"),
+)
+OAUTH_CALLBACKS = Counter(
+    "oauth_callbacks_total",
+    "OAuth callbacks by result: success, failure or invalid_state.",
+    ("provider", "result"),
+)
+OAUTH_CALLBACKS_SHARED = Counter(
+    "oauth_callbacks_shared_total",
+    "Duplicate callbacks that joined an in-flight login for the same code.",
+    ("provider",),
+)
+OAUTH_USERINFO_CACHE = Counter(
+    "oauth_userinfo_cache_total",
+    "Userinfo cache lookups by result: hit or miss.",
+    ("provider", "result"),
+)
+OAUTH_TOKEN_REFRESHES = Counter(
+    "oauth_token_refreshes_total",
+    "Background token refreshes by result: success, retry or failure.",
+    ("provider", "result"),
+)
+OAUTH_TOKEN_REVOCATIONS = Counter(
+    "oauth_token_revocations_total",
+    "Token revocations after logout by result: success, retry, failure or dropped.",
+    ("provider", "result"),
+)
+OAUTH_RATE_LIMITED = Counter(
+    "oauth_rate_limited_total",
+    "Authorize and callback requests rejected with 429, by reason: ip, provider or concurrency.",
+    ("provider", "reason"),
+)
+OAUTH_PROVIDER_REACHABLE = Gauge(
+    "oauth_provider_reachable",
+    "Whether the latest health probe reached the provider (1) or not (0).",
+    ("provider",),
+)
+OAUTH_PROVIDER_PROBE_SECONDS = Gauge(
+    "oauth_provider_probe_rtt_seconds",
+    "Round trip time of the latest successful health probe.",
+    ("provider",),
+)
+OAUTH_CIRCUIT_OPEN = Gauge(
+    "oauth_circuit_open",
+    "Whether a provider's circuit breaker is open (1) or closed (0).",
+    ("provider",),
+)
+
+
+@contextmanager
+def track_phase(provider: str, phase: str) -> Iterator[None]:
+    """Record duration, errors and in-flight count of one provider phase, and log its outcome."""
+    in_flight = OAUTH_PHASE_IN_FLIGHT.labels(provider, phase)
+    in_flight.inc()
+    started = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        # Cancelled by this server (a disconnect, shutdown or a fallback that wasn't needed), not a provider error
+        raise
+    except BaseException as e:
+        OAUTH_PHASE_ERRORS.labels(provider, phase).inc()
+        log_event("phase failed", provider=provider, phase=phase, started=started, error=e)
+        raise
+    else:
+        log_event("phase done", provider=provider, phase=phase, started=started)
+    finally:
+        OAUTH_PHASE_SECONDS.labels(provider, phase).observe(time.perf_counter() - started)
+        in_flight.dec()
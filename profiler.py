@@ -0,0 +1,186 @@
+"""On-demand sampling profiler for the running app.
+
+A background thread samples the event loop thread's stack at a fixed
+interval. While a profile runs, the app's middleware stack and the loop's
+task factory are wrapped so every sample can be attributed to the route
+being served, including tasks a request spawned (e.g. single-flight logins).
+Nothing is installed while no profile runs, so there is no overhead then.
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Coroutine
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Request scope of the running task, inherited by tasks it creates
+_request_scope: contextvars.ContextVar[Scope | None] = contextvars.ContextVar("profiled_request_scope", default=None)
+
+_lock = asyncio.Lock()
+
+
+class _ProfiledApp:
+    """Marks the request scope on the stack so samples can find their route."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+async def _attributed(coro: Coroutine, scope: Scope) -> Any:
+    # Only here so the sampler sees ``scope`` on the stack of spawned tasks
+    return await coro
+
+
+# Frames whose ``scope`` local names the route of a sample
+_SCOPE_CODES = {_ProfiledApp.__call__.__code__, _attributed.__code__}
+
+
+def _route_of(scope: Scope | None) -> str:
+    if not scope:
+        return "(no request)"
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    return "(unmatched)"
+
+
+_PATH_PREFIXES = sorted({os.path.join(os.path.abspath(path), "") for path in sys.path}, key=len, reverse=True)
+
+
+def _short_path(filename: str) -> str:
+    # Relative to the longest sys.path entry, e.g. ``asyncio/runners.py`` or ``clients/router.py``
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix) :]
+    return filename
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter[tuple[str, tuple[str, ...]]] = Counter()
+        self.frames: dict[str, tuple[str, str, int]] = {}
+        self._labels: dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _label(self, code: Any) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = _short_path(code.co_filename)
+            label = self._labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+            self.frames[label] = (code.co_name, filename, code.co_firstlineno)
+        return label
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._sample(frame)
+
+    def _sample(self, frame: Any) -> None:
+        stack = []
+        scope = None
+        while frame is not None:
+            code = frame.f_code
+            if scope is None and code in _SCOPE_CODES:
+                scope = frame.f_locals.get("scope")
+            stack.append(self._label(code))
+            frame = frame.f_back
+        stack.reverse()
+        self.samples[(_route_of(scope), tuple(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed stack format, with the route as root frame."""
+        lines = [f"{route};{';'.join(stack)} {count}" for (route, stack), count in self.samples.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> dict[str, Any]:
+        """Speedscope file with one sampled profile per route."""
+        index = {label: i for i, label in enumerate(self.frames)}
+        by_route: dict[str, list[tuple[tuple[str, ...], int]]] = {}
+        for (route, stack), count in self.samples.items():
+            by_route.setdefault(route, []).append((stack, count))
+        profiles = []
+        for route, samples in sorted(by_route.items(), key=lambda item: -sum(count for _, count in item[1])):
+            weights = [count * self.interval for _, count in samples]
+            profiles.append(
+                {
+                    "type": "sampled",
+                    "name": route,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": [[index[label] for label in stack] for stack, _ in samples],
+                    "weights": weights,
+                }
+            )
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{len(self.samples)} stacks over {self.elapsed:.1f}s",
+            "exporter": "fastapi-oauth20-demo",
+            "shared": {
+                "frames": [{"name": name, "file": file, "line": line} for name, file, line in self.frames.values()]
+            },
+            "profiles": profiles,
+        }
+
+
+def _task_factory(previous: Any):
+    def factory(loop: asyncio.AbstractEventLoop, coro: Coroutine, **kwargs: Any) -> asyncio.Future:
+        scope = _request_scope.get()
+        if scope is not None:
+            coro = _attributed(coro, scope)
+        if previous is not None:
+            return previous(loop, coro, **kwargs)
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    return factory
+
+
+def is_profiling() -> bool:
+    return _lock.locked()
+
+
+async def profile_app(app: Any, seconds: float, interval: float) -> SamplingProfiler:
+    """Profile the running app for ``seconds``; one profile at a time."""
+    async with _lock:
+        loop = asyncio.get_running_loop()
+        stack = app.middleware_stack or app.build_middleware_stack()
+        previous_factory = loop.get_task_factory()
+        app.middleware_stack = _ProfiledApp(stack)
+        loop.set_task_factory(_task_factory(previous_factory))
+        profiler = SamplingProfiler(threading.get_ident(), interval)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+            loop.set_task_factory(previous_factory)
+            app.middleware_stack = stack
+        return profiler
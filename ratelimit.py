@@ -0,0 +1,192 @@
+"""Admission control for the OAuth authorize and callback routes.
+
+Requests are checked against a token bucket per client IP and per provider,
+and callbacks, which call the provider, are capped per provider. Anything
+over a limit is rejected right away with 429 and ``Retry-After``.
+"""
+import json
+import math
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from metrics import OAUTH_RATE_LIMITED
+from sqlitedb import SQLiteDatabase
+
+_OAUTH_PATH = re.compile(r"^/api/v1/oauth2/([^/]+)/(authorize|callback)$")
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + (now - updated) * rate)
+
+
+class RateLimitBackend(ABC):
+    """Base class for token bucket storage."""
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        """Take a token from a bucket; returns 0 when allowed, else seconds until one is available."""
+
+    async def close(self) -> None:
+        return None
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in process memory, least recently used ones are dropped past ``max_entries``."""
+
+    def __init__(self, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        now = self.clock()
+        bucket = self._buckets.pop(key, None)
+        tokens = _refill(*bucket, now, rate, burst) if bucket else burst
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """Buckets in a SQLite file, shared by all worker processes."""
+
+    def __init__(self, path: str):
+        self.db = SQLiteDatabase(
+            path,
+            "CREATE TABLE IF NOT EXISTS rate_buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)",
+        )
+
+    def _take(self, key: str, rate: float, burst: float) -> float:
+        now = time.time()
+        # Immediate transaction so the read-modify-write is atomic across workers
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(*row, now, rate, burst) if row else burst
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            if self.db.purge_due():
+                # Idle for an hour, the bucket would be full again anyway
+                conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - 3600,))
+        return wait
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        return await self.db.run(self._take, key, rate, burst)
+
+    async def close(self) -> None:
+        self.db.close()
+
+
+class RateLimitMiddleware:
+    """Token buckets per client IP and per provider, plus a cap on concurrent callbacks per provider.
+
+    A rate of 0 turns the corresponding bucket off. ``provider_names`` maps
+    URL slugs to provider keys, unknown slugs are only limited per IP.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: RateLimitBackend,
+        provider_names: dict[str, str],
+        ip_rate: float,
+        ip_burst: int,
+        provider_rate: float,
+        provider_burst: int,
+        provider_rates: dict[str, float] | None = None,
+        provider_concurrency: int = 0,
+    ):
+        self.app = app
+        self.backend = backend
+        self.provider_names = provider_names
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.provider_rate = provider_rate
+        self.provider_burst = provider_burst
+        self.provider_rates = provider_rates or {}
+        self.provider_concurrency = provider_concurrency
+        self._in_flight: dict[str, int] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        match = _OAUTH_PATH.match(scope["path"]) if scope["type"] == "http" else None
+        if match is None:
+            await self.app(scope, receive, send)
+            return
+
+        provider = self.provider_names.get(match.group(1))
+        label = provider or "unknown"
+
+        if self.ip_rate > 0:
+            client = scope.get("client")
+            wait = await self.backend.take(f"ip:{client[0] if client else ''}", self.ip_rate, self.ip_burst)
+            if wait:
+                await self._reject(send, label, "ip", wait)
+                return
+
+        if provider is None:
+            await self.app(scope, receive, send)
+            return
+
+        rate = self.provider_rates.get(provider, self.provider_rate)
+        if rate > 0:
+            wait = await self.backend.take(f"provider:{provider}", rate, self.provider_burst)
+            if wait:
+                await self._reject(send, provider, "provider", wait)
+                return
+
+        # Only callbacks call the provider, authorize just builds a URL
+        if match.group(2) != "callback" or self.provider_concurrency <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        if self._in_flight.get(provider, 0) >= self.provider_concurrency:
+            await self._reject(send, provider, "concurrency", 1.0)
+            return
+        self._in_flight[provider] = self._in_flight.get(provider, 0) + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._in_flight[provider] -= 1
+
+    async def _reject(self, send: Send, provider: str, reason: str, wait: float) -> None:
+        OAUTH_RATE_LIMITED.labels(provider, reason).inc()
+        body = json.dumps({"error": "rate_limited"}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_rate_limit_backend(backend: str, *, sqlite_path: str, max_entries: int) -> RateLimitBackend:
+    """Build the rate limit backend for the configured name."""
+    if backend == "memory":
+        return MemoryRateLimitBackend(max_entries=max_entries)
+    if backend == "sqlite":
+        return SQLiteRateLimitBackend(sqlite_path)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
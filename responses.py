@@ -0,0 +1,94 @@
+"""Helpers for serving pre-encoded, cacheable responses."""
+import gzip
+import hashlib
+
+from fastapi import Request, status
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_etag(body: bytes) -> str:
+    """Build a strong ETag from the response body."""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check the request's If-None-Match header against an ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def cached_response(
+    request: Request,
+    body: bytes,
+    *,
+    etag: str,
+    media_type: str,
+    cache_control: str,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """Serve a pre-encoded body, or 304 when the client already has it."""
+    headers = {"ETag": etag, "Cache-Control": cache_control, **(headers or {})}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def negotiate_encoding(request: Request, available: tuple[str, ...]) -> str:
+    """Pick the first of ``available`` content codings that the client accepts."""
+    accepted: dict[str, float] = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    for coding in available:
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return "identity"
+
+
+class PrecompressedBody:
+    """A response body encoded once with every supported content coding."""
+
+    def __init__(self, body: bytes, media_type: str):
+        self.media_type = media_type
+        self.variants: dict[str, tuple[bytes, str]] = {"identity": (body, make_etag(body))}
+        if brotli is not None:
+            encoded = brotli.compress(body, quality=11)
+            self.variants["br"] = (encoded, make_etag(encoded))
+        encoded = gzip.compress(body, compresslevel=9, mtime=0)
+        self.variants["gzip"] = (encoded, make_etag(encoded))
+        self.encodings = tuple(coding for coding in ("br", "gzip") if coding in self.variants)
+
+    def response(self, request: Request, *, cache_control: str) -> Response:
+        """Serve the best encoding for the request, with ETag revalidation."""
+        coding = negotiate_encoding(request, self.encodings)
+        body, etag = self.variants[coding]
+        headers = {"Vary": "Accept-Encoding"}
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return cached_response(
+            request,
+            body,
+            etag=etag,
+            media_type=self.media_type,
+            cache_control=cache_control,
+            headers=headers,
+        )
@@ -0,0 +1,84 @@
+"""Production entrypoint.
+
+Runs the app under uvicorn with settings from ``config.Settings``: one worker
+per core, uvloop and httptools when installed, and a graceful drain on
+SIGTERM that lets in-flight logins finish before the lifespan shuts down::
+
+    python server.py
+"""
+import importlib.util
+import os
+
+import uvicorn
+
+from config import settings
+from logs import logger, start_logging, stop_logging
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def process_local_stores() -> list[str]:
+    """Settings that keep login state in one process, which breaks with several workers."""
+    stores = {
+        "OAUTH_STATE_BACKEND": settings.OAUTH_STATE_BACKEND,
+        "SESSION_BACKEND": settings.SESSION_BACKEND,
+        "TOKEN_STORE_BACKEND": settings.TOKEN_STORE_BACKEND,
+    }
+    return [name for name, backend in stores.items() if backend == "memory"]
+
+
+def worker_count() -> int:
+    """Configured worker count; 0 means one per core, or a single worker while state is process-local."""
+    if settings.SERVER_WORKERS > 0:
+        local = process_local_stores()
+        if settings.SERVER_WORKERS > 1 and local:
+            raise SystemExit(
+                f"SERVER_WORKERS={settings.SERVER_WORKERS} needs shared stores, set {', '.join(local)} "
+                "to sqlite (or SESSION_BACKEND to cookie)"
+            )
+        return settings.SERVER_WORKERS
+    if process_local_stores():
+        return 1
+    return os.cpu_count() or 1
+
+
+def run() -> None:
+    workers = worker_count()
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+    # Same JSON lines as the workers write; stopped again so the records are flushed before uvicorn starts
+    start_logging()
+    try:
+        if workers > 1 and settings.RATE_LIMIT_ENABLED and settings.RATE_LIMIT_BACKEND == "memory":
+            logger.warning(
+                "Rate limit buckets are per worker, set RATE_LIMIT_BACKEND=sqlite to share them",
+                extra={"phase": "startup"},
+            )
+        logger.info(
+            f"Starting {workers} worker(s) on {settings.SERVER_HOST}:{settings.SERVER_PORT} with {loop} and {http}",
+            extra={"phase": "startup"},
+        )
+    finally:
+        stop_logging()
+
+    uvicorn.run(
+        "main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_TIMEOUT,
+        # SIGTERM stops accepting, then waits this long for in-flight requests
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+        limit_concurrency=settings.SERVER_LIMIT_CONCURRENCY or None,
+        forwarded_allow_ips=settings.SERVER_FORWARDED_ALLOW_IPS,
+        access_log=settings.SERVER_ACCESS_LOG,
+    )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,296 @@
+"""Server-side session storage.
+
+The cookie only carries an opaque random session ID, the session data itself
+lives in a pluggable store.
+"""
+import re
+import secrets
+import time
+from abc import ABC, abstractmethod
+from base64 import b64decode, b64encode
+from typing import Any, Awaitable, Callable
+
+from itsdangerous import BadSignature
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from cache import TTLCache
+from fastjson import dumps, loads
+from sqlitedb import SQLiteDatabase
+
+# Called with the session and its new expiry (Unix time) when an unchanged session is renewed
+RenewHook = Callable[[dict[str, Any], float], Awaitable[None]]
+
+
+class SessionStore(ABC):
+    """Base class for session backends."""
+
+    @abstractmethod
+    async def load(self, session_id: str) -> tuple[dict[str, Any], float] | None:
+        """The session's data and its expiry as a Unix time, None when it doesn't exist or expired."""
+
+    @abstractmethod
+    async def save(self, session_id: str, data: dict[str, Any], max_age: int) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        ...
+
+    async def close(self) -> None:
+        return None
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store with TTL expiry and LRU eviction, for a single worker."""
+
+    def __init__(self, max_entries: int = 10000):
+        self._entries = TTLCache(max_entries=max_entries, ttl=0)
+
+    async def load(self, session_id: str) -> tuple[dict[str, Any], float] | None:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        expires, data = entry
+        return dict(data), expires
+
+    async def save(self, session_id: str, data: dict[str, Any], max_age: int) -> None:
+        self._entries.set(session_id, (time.time() + max_age, dict(data)), ttl=max_age)
+
+    async def delete(self, session_id: str) -> None:
+        self._entries.pop(session_id)
+
+
+class SQLiteSessionStore(SessionStore):
+    """File-backed store that several worker processes can share."""
+
+    def __init__(self, path: str):
+        self.db = SQLiteDatabase(
+            path, "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def _load(self, session_id: str) -> tuple[dict[str, Any], float] | None:
+        with self.db.connection() as conn:
+            row = conn.execute(
+                "SELECT data, expires FROM sessions WHERE id = ? AND expires >= ?",
+                (session_id, time.time()),
+            ).fetchone()
+        return (loads(row[0]), row[1]) if row else None
+
+    def _save(self, session_id: str, data: bytes, max_age: int) -> None:
+        now = time.time()
+        with self.db.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)",
+                (session_id, data, now + max_age),
+            )
+            if self.db.purge_due():
+                conn.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+
+    def _delete(self, session_id: str) -> None:
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    async def load(self, session_id: str) -> tuple[dict[str, Any], float] | None:
+        return await self.db.run(self._load, session_id)
+
+    async def save(self, session_id: str, data: dict[str, Any], max_age: int) -> None:
+        await self.db.run(self._save, session_id, dumps(data), max_age)
+
+    async def delete(self, session_id: str) -> None:
+        await self.db.run(self._delete, session_id)
+
+    async def close(self) -> None:
+        self.db.close()
+
+
+class Session(dict):
+    """Session dict that remembers whether it was changed during the request."""
+
+    modified = False
+    # Whether the logged-in user was written, which gets the session a new ID
+    user_written = False
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.modified = True
+        if key == "user":
+            self.user_written = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self.modified = True
+        super().__delitem__(key)
+
+    def clear(self) -> None:
+        self.modified = True
+        super().clear()
+
+    def pop(self, key: str, *args: Any) -> Any:
+        self.modified = True
+        return super().pop(key, *args)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self.modified = True
+        super().update(*args, **kwargs)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self.modified = True
+        return super().setdefault(key, default)
+
+
+class ServerSessionMiddleware:
+    """Drop-in replacement for Starlette's SessionMiddleware backed by a SessionStore.
+
+    Like Starlette's, the expiry slides with activity: an unchanged session is
+    stored again and its cookie re-sent once less than half its lifetime is
+    left, and ``on_renew`` is told about it.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: SessionStore,
+        session_cookie: str = "session",
+        max_age: int = 14 * 24 * 60 * 60,
+        path: str = "/",
+        same_site: str = "lax",
+        https_only: bool = False,
+        on_renew: RenewHook | None = None,
+    ):
+        self.app = app
+        self.store = store
+        self.on_renew = on_renew
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.security_flags = f"httponly; samesite={same_site}" + ("; secure" if https_only else "")
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id = HTTPConnection(scope).cookies.get(self.session_cookie)
+        loaded = await self.store.load(session_id) if session_id else None
+        if loaded is None:
+            session_id = None
+            data, expires = {}, 0.0
+        else:
+            data, expires = loaded
+        session = Session(data)
+        scope["session"] = session
+
+        async def send_wrapper(message: Message) -> None:
+            renew = bool(session) and expires - time.time() < self.max_age / 2
+            if message["type"] == "http.response.start" and (session.modified or renew):
+                headers = MutableHeaders(scope=message)
+                if session:
+                    sid = session_id
+                    if sid is None or session.user_written:
+                        # New ID on every login, so a planted session ID can't be logged into
+                        sid = secrets.token_urlsafe(32)
+                        if session_id is not None:
+                            await self.store.delete(session_id)
+                    await self.store.save(sid, dict(session), self.max_age)
+                    if not session.modified and self.on_renew is not None:
+                        await self.on_renew(session, time.time() + self.max_age)
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}={sid}; path={self.path}; Max-Age={self.max_age}; {self.security_flags}",
+                    )
+                elif session_id:
+                    await self.store.delete(session_id)
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}=null; path={self.path}; "
+                        f"expires=Thu, 01 Jan 1970 00:00:00 GMT; {self.security_flags}",
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class FastJSONSessionMiddleware(SessionMiddleware):
+    """Starlette's signed cookie sessions, encoded with the fast JSON backend.
+
+    Cookies keep Starlette's format (signed base64 JSON), so existing sessions
+    stay valid. An unchanged session is only re-signed once it is older than
+    half of ``max_age``, which keeps the expiry sliding with activity, and
+    ``on_renew`` is told about it.
+    """
+
+    def __init__(self, app: ASGIApp, *args: Any, on_renew: RenewHook | None = None, **kwargs: Any):
+        super().__init__(app, *args, **kwargs)
+        self.on_renew = on_renew
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        cookie = HTTPConnection(scope).cookies.get(self.session_cookie)
+        data = None
+        signed_at = 0.0
+        if cookie:
+            try:
+                value, timestamp = self.signer.unsign(
+                    cookie.encode("utf-8"), max_age=self.max_age, return_timestamp=True
+                )
+                data = loads(b64decode(value))
+                signed_at = timestamp.timestamp()
+            except BadSignature:
+                pass
+        session = Session(data or {})
+        scope["session"] = session
+
+        async def send_wrapper(message: Message) -> None:
+            renew = bool(session) and self.max_age is not None and time.time() - signed_at > self.max_age / 2
+            if message["type"] == "http.response.start" and (session.modified or renew):
+                headers = MutableHeaders(scope=message)
+                if session:
+                    value = self.signer.sign(b64encode(dumps(dict(session)))).decode("utf-8")
+                    if not session.modified and self.on_renew is not None:
+                        await self.on_renew(session, time.time() + self.max_age)
+                    max_age = f"Max-Age={self.max_age}; " if self.max_age is not None else ""
+                    headers.append(
+                        "Set-Cookie", f"{self.session_cookie}={value}; path={self.path}; {max_age}{self.security_flags}"
+                    )
+                elif data is not None:
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}=null; path={self.path}; "
+                        f"expires=Thu, 01 Jan 1970 00:00:00 GMT; {self.security_flags}",
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class PathScopedMiddleware:
+    """Run a middleware only for paths that match ``paths``, other requests bypass it.
+
+    A request that already has a session in its scope is passed straight
+    through, so the session is loaded and verified at most once.
+    """
+
+    def __init__(self, app: ASGIApp, middleware: type, paths: str, **options: Any):
+        self.app = app
+        self.scoped = middleware(app, **options)
+        self.paths = re.compile(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] in ("http", "websocket") and "session" not in scope and self.paths.match(scope["path"]):
+            await self.scoped(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+def create_session_store(backend: str, *, sqlite_path: str, max_entries: int) -> SessionStore:
+    """Build the session store for the configured backend."""
+    if backend == "memory":
+        return MemorySessionStore(max_entries=max_entries)
+    if backend == "sqlite":
+        return SQLiteSessionStore(sqlite_path)
+    raise ValueError(f"Unknown session backend: {backend}")
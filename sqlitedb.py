@@ -0,0 +1,71 @@
+"""Connection handling shared by the SQLite-backed stores.
+
+Each store opens one WAL-mode connection per process on first use. Statements
+run on worker threads under a lock, because the connection is shared by those
+threads, and read-modify-write sequences use immediate transactions, so they
+are atomic across worker processes too.
+"""
+import asyncio
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class SQLiteDatabase:
+    """A lazily opened SQLite connection with its schema."""
+
+    def __init__(self, path: str, *schema: str, purge_interval: int = 1000):
+        self.path = path
+        self.schema = schema
+        # Stores purge expired rows once every this many writes
+        self.purge_interval = purge_interval
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """The connection, locked for the duration of the block."""
+        with self._lock:
+            yield self._connect()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """The connection inside an immediate transaction, rolled back if the block raises."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def purge_due(self) -> bool:
+        """Count a write; True once every ``purge_interval`` writes. Call with the connection held."""
+        self._writes += 1
+        return self._writes % self.purge_interval == 0
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a blocking store method on a worker thread."""
+        return await asyncio.to_thread(func, *args)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
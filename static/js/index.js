@@ -0,0 +1,59 @@
+// Get the authorization URL
+const authUrl = window.location.origin + '/api/v1/oauth2/wechat_mp/authorize';
+
+function showWeChatMPModal() {
+    const modal = document.getElementById('wechatMPModal');
+    const linkInput = document.getElementById('authLink');
+    linkInput.value = authUrl;
+    modal.classList.add('show');
+}
+
+function closeWeChatMPModal() {
+    const modal = document.getElementById('wechatMPModal');
+    modal.classList.remove('show');
+}
+
+function copyAuthLink() {
+    const linkInput = document.getElementById('authLink');
+    linkInput.select();
+    linkInput.setSelectionRange(0, 99999); // For mobile devices
+
+    navigator.clipboard.writeText(linkInput.value).then(() => {
+        const btn = event.target;
+        const originalText = btn.textContent;
+        btn.textContent = '已复制';
+        btn.classList.add('copied');
+
+        setTimeout(() => {
+            btn.textContent = originalText;
+            btn.classList.remove('copied');
+        }, 2000);
+    }).catch(err => {
+        // Fallback for older browsers
+        document.execCommand('copy');
+        const btn = event.target;
+        const originalText = btn.textContent;
+        btn.textContent = '已复制';
+        btn.classList.add('copied');
+
+        setTimeout(() => {
+            btn.textContent = originalText;
+            btn.classList.remove('copied');
+        }, 2000);
+    });
+}
+
+// Close modal when clicking outside
+window.onclick = function(event) {
+    const modal = document.getElementById('wechatMPModal');
+    if (event.target === modal) {
+        closeWeChatMPModal();
+    }
+}
+
+// Close modal with Escape key
+document.addEventListener('keydown', function(event) {
+    if (event.key === 'Escape') {
+        closeWeChatMPModal();
+    }
+});
@@ -0,0 +1,59 @@
+"""Static files: only URLs versioned with the current content hash are immutable."""
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+import assets
+import main
+from assets import ImmutableStaticFiles, file_version, static_url
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def version(path) -> str:
+    stat_result = os.stat(path)
+    return file_version(str(path), stat_result.st_mtime_ns, stat_result.st_size)
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "app.css").write_text("body { color: black; }")
+    return tmp_path
+
+
+@pytest.fixture
+def client(static_dir) -> TestClient:
+    return TestClient(Starlette(routes=[Mount("/static", ImmutableStaticFiles(directory=static_dir))]))
+
+
+def test_current_version_is_immutable(client, static_dir):
+    response = client.get(f"/static/app.css?v={version(static_dir / 'app.css')}")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE
+
+
+@pytest.mark.parametrize("query", ["", "?v=0123456789abcdef", "?dev=1", "?v=", "?v={v}&v=0123456789abcdef"])
+def test_other_urls_are_not_immutable(client, static_dir, query):
+    response = client.get("/static/app.css" + query.format(v=version(static_dir / "app.css")))
+    assert response.status_code == 200
+    assert "immutable" not in response.headers.get("cache-control", "")
+
+
+def test_changed_file_unpins_the_old_version(client, static_dir):
+    path = static_dir / "app.css"
+    old = version(path)
+    path.write_text("body { color: white; background: black; }")
+    assert "immutable" not in client.get(f"/static/app.css?v={old}").headers.get("cache-control", "")
+    assert client.get(f"/static/app.css?v={version(path)}").headers["cache-control"] == IMMUTABLE
+
+
+@pytest.mark.parametrize("path", ["css/index.css", "js/index.js"])
+def test_static_url_is_served_immutable(path):
+    url = static_url(path)
+    assert url == f"/static/{path}?v={version(os.path.join(assets.STATIC_DIRECTORY, path))}"
+    response = TestClient(main.app).get(url)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE
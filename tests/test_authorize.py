@@ -0,0 +1,73 @@
+"""Precompiled authorize URLs against the library's, and the PKCE S256 challenge."""
+import asyncio
+import base64
+import hashlib
+import secrets
+
+import pytest
+
+from clients.authorize import code_challenge, compile_authorize_url, pkce_pair
+from clients.registry import PROVIDERS
+from config import settings
+
+# Needs encoding in the query: a query string of its own, a space and a non-ASCII character
+REDIRECT_URI = "https://app.example/api/v1/oauth2/callback?next=/home&tab=a b&lang=中文"
+
+
+def provider(name: str, monkeypatch):
+    spec = PROVIDERS[name]
+    monkeypatch.setattr(settings, f"{spec.settings_prefix}_REDIRECT_URI", REDIRECT_URI)
+    return spec, spec.load_client_class()(client_id="client id/+", client_secret="secret")
+
+
+@pytest.mark.parametrize("name", list(PROVIDERS))
+def test_matches_the_library_url(name, monkeypatch):
+    spec, client = provider(name, monkeypatch)
+    state = secrets.token_urlsafe(24)
+
+    async def urls() -> tuple[str, str]:
+        authorize_url = await compile_authorize_url(spec.name, client)
+        return authorize_url.build(state), await client.get_authorization_url(redirect_uri=REDIRECT_URI, state=state)
+
+    built, expected = asyncio.run(urls())
+    assert built == expected
+
+
+@pytest.mark.parametrize("name", [name for name, spec in PROVIDERS.items() if spec.pkce])
+def test_matches_the_library_url_with_pkce(name, monkeypatch):
+    spec, client = provider(name, monkeypatch)
+    state = secrets.token_urlsafe(24)
+    _, challenge = pkce_pair()
+
+    async def urls() -> tuple[str, str]:
+        authorize_url = await compile_authorize_url(spec.name, client)
+        expected = await client.get_authorization_url(
+            redirect_uri=REDIRECT_URI, state=state, code_challenge=challenge, code_challenge_method="S256"
+        )
+        return authorize_url.build(state, challenge), expected
+
+    built, expected = asyncio.run(urls())
+    assert built == expected
+
+
+def test_wechat_keeps_its_fragment():
+    spec = PROVIDERS["wechat_open"]
+    client = spec.load_client_class()(client_id="appid", client_secret="secret")
+    authorize_url = asyncio.run(compile_authorize_url(spec.name, client))
+    assert authorize_url.build("state").endswith("#wechat_redirect")
+
+
+def test_rfc_7636_example():
+    # RFC 7636, appendix B
+    assert code_challenge("dBjftJeZ4CVP-mB92K27uhbUJU1p1r_wW1gFWFOEjXk") == "E9Melhoa2OwvFrEMTJguCHaoeK1t8URWbuGJSstw-cM"
+
+
+def test_pkce_pair():
+    verifier, challenge = pkce_pair()
+    digest = hashlib.sha256(verifier.encode("ascii")).digest()
+    assert challenge == base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+    assert "=" not in challenge
+    # 43 to 128 unreserved characters
+    assert 43 <= len(verifier) <= 128
+    assert set(verifier) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+    assert pkce_pair()[0] != verifier
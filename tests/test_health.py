@@ -0,0 +1,98 @@
+"""Warm-up and probe loop shutdown."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from clients import health
+from config import settings
+
+CLIENTS = {"github": SimpleNamespace(), "google": SimpleNamespace()}
+
+
+@pytest.fixture(autouse=True)
+def probe_settings(monkeypatch):
+    monkeypatch.setattr(settings, "HEALTH_WARMUP_TIMEOUT", 5.0)
+    monkeypatch.setattr(settings, "HEALTH_PROBE_INTERVAL", 20.0)
+    yield
+    health._clients.clear()
+    health._health.clear()
+    health._warmed_up = False
+    health._probe_task = None
+
+
+def test_cancel_as_the_warm_up_finishes_stops_the_loop(monkeypatch):
+    async def probe(name, client, connections=1):
+        # The cancel lands after the probes are done but before the loop resumes
+        asyncio.get_running_loop().call_soon(health._probe_task.cancel)
+
+    monkeypatch.setattr(health, "probe", probe)
+
+    async def run() -> asyncio.Task:
+        await health.start_health(CLIENTS)
+        task = health._probe_task
+        await asyncio.sleep(0.05)
+        return task
+
+    task = asyncio.run(run())
+    assert task.cancelled()
+    assert not health._warmed_up
+
+
+def test_stop_during_the_warm_up_returns(monkeypatch):
+    async def probe(name, client, connections=1):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(health, "probe", probe)
+
+    async def run() -> asyncio.Task:
+        await health.start_health(CLIENTS)
+        task = health._probe_task
+        await asyncio.sleep(0.01)
+        assert health.health_snapshot()["status"] == "starting"
+        await asyncio.wait_for(health.stop_health(), timeout=1)
+        return task
+
+    assert asyncio.run(run()).cancelled()
+
+
+def test_stop_is_bounded(monkeypatch):
+    async def probe(name, client, connections=1):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            # Takes much longer than the shutdown waits to wind down
+            await asyncio.sleep(0.5)
+
+    monkeypatch.setattr(health, "probe", probe)
+    monkeypatch.setattr(health, "_STOP_TIMEOUT", 0.05)
+
+    async def run() -> None:
+        await health.start_health(CLIENTS)
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(health.stop_health(), timeout=0.3)
+
+    asyncio.run(run())
+    assert health._probe_task is None
+
+
+def test_slow_provider_does_not_hold_up_readiness(monkeypatch):
+    monkeypatch.setattr(settings, "HEALTH_WARMUP_TIMEOUT", 0.05)
+
+    async def probe(name, client, connections=1):
+        if name == "google":
+            await asyncio.sleep(10)
+        health._health[name] = health.ProviderHealth(reachable=True)
+
+    monkeypatch.setattr(health, "probe", probe)
+
+    async def run() -> str:
+        await health.start_health(CLIENTS)
+        await asyncio.sleep(0.2)
+        try:
+            return health.health_snapshot()["status"]
+        finally:
+            await health.stop_health()
+
+    # Warmed up, google's probe is still unanswered
+    assert asyncio.run(run()) == "degraded"
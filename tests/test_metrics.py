@@ -0,0 +1,45 @@
+"""Phase tracking: what counts as a provider error."""
+import asyncio
+
+import pytest
+
+from metrics import OAUTH_PHASE_ERRORS, OAUTH_PHASE_IN_FLIGHT, OAUTH_PHASE_SECONDS, track_phase
+
+
+def errors(phase: str) -> float:
+    return OAUTH_PHASE_ERRORS.labels("github", phase).value
+
+
+def test_failed_phase_is_an_error():
+    with pytest.raises(RuntimeError):
+        with track_phase("github", "test_failed"):
+            raise RuntimeError("boom")
+    assert errors("test_failed") == 1
+    assert OAUTH_PHASE_IN_FLIGHT.labels("github", "test_failed").value == 0
+
+
+def test_cancelled_phase_is_not_an_error():
+    async def phase() -> None:
+        with track_phase("github", "test_cancelled"):
+            await asyncio.sleep(10)
+
+    async def run() -> None:
+        task = asyncio.create_task(phase())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert errors("test_cancelled") == 0
+    assert OAUTH_PHASE_IN_FLIGHT.labels("github", "test_cancelled").value == 0
+    assert OAUTH_PHASE_SECONDS.labels("github", "test_cancelled").count == 1
+
+
+def test_timed_out_phase_is_an_error():
+    async def run() -> None:
+        with track_phase("github", "test_timeout"):
+            await asyncio.wait_for(asyncio.sleep(10), timeout=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert errors("test_timeout") == 1
@@ -0,0 +1,161 @@
+"""Local ID token verification against signed tokens and the mock provider."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from benchmarks.mock_provider import (
+    MockProviderServer,
+    b64url,
+    create_mock_provider,
+    public_jwk,
+    sign_jwt,
+)
+from clients import oidc
+from clients.transport import close_http_client, get_http_client, open_http_client
+
+ISSUER = "https://accounts.example.com"
+CLIENT = SimpleNamespace(client_id="demo-client")
+KID = "key-1"
+
+
+@pytest.fixture(scope="module")
+def signing_key() -> rsa.RSAPrivateKey:
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def keys(signing_key: rsa.RSAPrivateKey):
+    oidc._keys["google"] = oidc.OIDCKeys(
+        issuer=ISSUER,
+        keys={KID: oidc._public_key(public_jwk(signing_key, KID))},
+        fetched_at=time.monotonic(),
+    )
+    yield
+    oidc._keys.clear()
+
+
+def claims(**overrides) -> dict:
+    now = int(time.time())
+    return {"iss": ISSUER, "aud": CLIENT.client_id, "sub": "42", "iat": now, "exp": now + 3600, **overrides}
+
+
+def verify(id_token: str) -> dict | None:
+    return asyncio.run(oidc.verify_id_token("google", CLIENT, id_token))
+
+
+def test_valid_signature(keys, signing_key):
+    expected = claims(email="octocat@example.com")
+    assert verify(sign_jwt(signing_key, KID, expected)) == expected
+
+
+def test_audience_list(keys, signing_key):
+    assert verify(sign_jwt(signing_key, KID, claims(aud=["other", CLIENT.client_id]))) is not None
+
+
+def test_issuer_without_scheme(keys, signing_key):
+    # Google issues both "https://accounts.google.com" and "accounts.google.com"
+    assert verify(sign_jwt(signing_key, KID, claims(iss="accounts.example.com"))) is not None
+
+
+def test_signature_from_another_key(keys):
+    other = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    assert verify(sign_jwt(other, KID, claims())) is None
+
+
+def test_tampered_payload(keys, signing_key):
+    header, _, signature = sign_jwt(signing_key, KID, claims()).split(".")
+    _, payload, _ = sign_jwt(signing_key, KID, claims(sub="43")).split(".")
+    assert verify(f"{header}.{payload}.{signature}") is None
+
+
+def test_unsigned_token(keys, signing_key):
+    header, payload, _ = sign_jwt(signing_key, KID, claims()).split(".")
+    none_header = b64url(b'{"alg":"none","kid":"key-1"}')
+    assert verify(f"{none_header}.{payload}.") is None
+    assert verify(f"{header}.{payload}.") is None
+
+
+def test_unknown_key_id(keys, signing_key):
+    assert verify(sign_jwt(signing_key, "key-2", claims())) is None
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"aud": "other-client"},
+        {"aud": ["other-client"]},
+        {"iss": "https://evil.example.com"},
+        {"sub": ""},
+        {"exp": int(time.time()) - 3600},
+        {"iat": int(time.time()) + 3600},
+    ],
+    ids=["wrong-aud", "wrong-aud-list", "wrong-iss", "no-sub", "expired", "issued-in-future"],
+)
+def test_rejected_claims(keys, signing_key, overrides):
+    assert verify(sign_jwt(signing_key, KID, claims(**overrides))) is None
+
+
+def test_expiry_leeway(keys, signing_key):
+    assert verify(sign_jwt(signing_key, KID, claims(exp=int(time.time()) - 10))) is not None
+
+
+def test_keys_not_loaded_yet(signing_key, monkeypatch):
+    fetched = []
+
+    async def refresh_keys(provider: str) -> None:
+        fetched.append(provider)
+
+    monkeypatch.setattr(oidc, "refresh_keys", refresh_keys)
+    oidc._keys["google"] = oidc.OIDCKeys(issuer=ISSUER)
+    try:
+        # Falls back to userinfo, the keys are fetched by the refresher and not on the login path
+        assert verify(sign_jwt(signing_key, KID, claims())) is None
+    finally:
+        oidc._keys.clear()
+    assert fetched == []
+
+
+async def wait_for_keys(provider: str) -> None:
+    for _ in range(100):
+        if oidc._keys[provider].fetched_at:
+            return
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"{provider} keys not loaded")
+
+
+def test_mock_provider_discovery_and_id_token():
+    server = MockProviderServer(create_mock_provider()).start()
+    issuer = f"{server.url}/google"
+
+    async def login() -> dict | None:
+        open_http_client({})
+        try:
+            await oidc.start_oidc({"google": SimpleNamespace(oidc_issuer=issuer)})
+            # Keys are loaded in the background, start_oidc doesn't wait for them
+            assert not oidc._keys["google"].fetched_at
+            await wait_for_keys("google")
+            http = get_http_client()
+            response = await http.get(f"{issuer}/authorize", params={"redirect_uri": "http://app/callback"})
+            code = response.headers["location"].partition("code=")[2]
+            response = await http.post(
+                f"{issuer}/token",
+                data={"code": code, "client_id": CLIENT.client_id, "grant_type": "authorization_code"},
+            )
+            return await oidc.verify_id_token("google", CLIENT, response.json()["id_token"])
+        finally:
+            await oidc.stop_oidc()
+            await close_http_client()
+
+    try:
+        verified = asyncio.run(login())
+    finally:
+        server.stop()
+    assert verified is not None
+    assert verified["iss"] == issuer
+    assert oidc.claims_to_userinfo(verified)["verified_email"] is True
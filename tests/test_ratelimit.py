@@ -0,0 +1,194 @@
+"""Token buckets, per-IP and per-provider rejection and the callback concurrency cap."""
+import asyncio
+
+import pytest
+
+from ratelimit import MemoryRateLimitBackend, RateLimitMiddleware, SQLiteRateLimitBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeApp:
+    """ASGI app that answers 200, optionally after waiting for ``release`` or raising."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release: asyncio.Event | None = None
+        self.error: Exception | None = None
+
+    async def __call__(self, scope, receive, send) -> None:
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+
+def limiter(app: FakeApp, backend=None, **options) -> RateLimitMiddleware:
+    defaults = dict(ip_rate=0, ip_burst=1, provider_rate=0, provider_burst=1, provider_concurrency=0)
+    return RateLimitMiddleware(
+        app,
+        backend=backend or MemoryRateLimitBackend(max_entries=100),
+        provider_names={"github": "github", "linux-do": "linuxdo"},
+        **{**defaults, **options},
+    )
+
+
+async def request(middleware, path: str = "/api/v1/oauth2/github/callback", ip: str = "10.0.0.1") -> dict:
+    """Send one request through the middleware and return the status and headers it answered with."""
+    messages = []
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b""}
+
+    async def send(message: dict) -> None:
+        messages.append(message)
+
+    await middleware({"type": "http", "path": path, "client": (ip, 50000)}, receive, send)
+    start = messages[0]
+    return {"status": start["status"], **{k.decode(): v.decode() for k, v in start["headers"]}}
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = Clock()
+    backend = MemoryRateLimitBackend(max_entries=10, clock=clock)
+
+    async def take() -> float:
+        return await backend.take("key", 1.0, 2)
+
+    assert asyncio.run(take()) == 0
+    assert asyncio.run(take()) == 0
+    assert asyncio.run(take()) == pytest.approx(1.0)
+    clock.now += 0.5
+    # The rejected take didn't use up a token, half of one has been refilled since
+    assert asyncio.run(take()) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert asyncio.run(take()) == 0
+    clock.now += 100
+    # Refill stops at the burst size
+    assert [asyncio.run(take()) for _ in range(3)] == [0, 0, pytest.approx(1.0)]
+
+
+def test_memory_backend_is_capped():
+    backend = MemoryRateLimitBackend(max_entries=2)
+    for key in ("a", "b", "c"):
+        asyncio.run(backend.take(key, 1.0, 1))
+    assert list(backend._buckets) == ["b", "c"]
+
+
+def test_sqlite_bucket(tmp_path):
+    backend = SQLiteRateLimitBackend(str(tmp_path / "ratelimit.db"))
+
+    async def run() -> list[float]:
+        return [await backend.take("key", 0.001, 2) for _ in range(3)]
+
+    try:
+        waits = asyncio.run(run())
+    finally:
+        asyncio.run(backend.close())
+    assert waits[:2] == [0, 0]
+    assert waits[2] > 900
+
+
+def test_ip_limit_is_per_client():
+    app = FakeApp()
+    middleware = limiter(app, ip_rate=0.1, ip_burst=2)
+
+    async def run() -> list[dict]:
+        return [
+            await request(middleware, ip="10.0.0.1"),
+            await request(middleware, ip="10.0.0.1", path="/api/v1/oauth2/github/authorize"),
+            await request(middleware, ip="10.0.0.1"),
+            await request(middleware, ip="10.0.0.2"),
+        ]
+
+    responses = asyncio.run(run())
+    assert [response["status"] for response in responses] == [200, 200, 429, 200]
+    # One token every 10 seconds
+    assert responses[2]["retry-after"] == "10"
+    assert app.calls == 3
+
+
+def test_provider_limit_is_shared_by_clients():
+    clock = Clock()
+    backend = MemoryRateLimitBackend(max_entries=100, clock=clock)
+    middleware = limiter(FakeApp(), backend, provider_rate=0.5, provider_burst=1, provider_rates={"linuxdo": 100.0})
+    linuxdo = "/api/v1/oauth2/linux-do/callback"
+
+    async def run() -> list[int]:
+        statuses = [
+            (await request(middleware, ip="10.0.0.1"))["status"],
+            (await request(middleware, ip="10.0.0.2"))["status"],
+            # Another provider has its own bucket
+            (await request(middleware, ip="10.0.0.2", path=linuxdo))["status"],
+            (await request(middleware, ip="10.0.0.2", path=linuxdo))["status"],
+        ]
+        # And its own rate: a token is back for linuxdo, not yet for github
+        clock.now += 0.1
+        statuses.append((await request(middleware, ip="10.0.0.2", path=linuxdo))["status"])
+        statuses.append((await request(middleware, ip="10.0.0.2"))["status"])
+        return statuses
+
+    assert asyncio.run(run()) == [200, 429, 200, 429, 200, 429]
+
+
+def test_retry_after_is_at_least_one_second():
+    middleware = limiter(FakeApp(), ip_rate=100.0, ip_burst=1)
+
+    async def run() -> dict:
+        await request(middleware)
+        return await request(middleware)
+
+    response = asyncio.run(run())
+    assert response["status"] == 429
+    assert response["retry-after"] == "1"
+
+
+def test_other_paths_are_not_limited():
+    app = FakeApp()
+    middleware = limiter(app, ip_rate=0.001, ip_burst=1)
+
+    async def run() -> list[int]:
+        return [(await request(middleware, path="/api/user"))["status"] for _ in range(5)]
+
+    assert asyncio.run(run()) == [200] * 5
+
+
+def test_concurrent_callbacks_are_capped():
+    app = FakeApp()
+    middleware = limiter(app, provider_concurrency=1)
+
+    async def run() -> list[int]:
+        app.release = asyncio.Event()
+        first = asyncio.create_task(request(middleware))
+        await asyncio.sleep(0)
+        rejected = await request(middleware)
+        # Authorize only builds a URL, it isn't capped
+        authorize = asyncio.create_task(request(middleware, path="/api/v1/oauth2/github/authorize"))
+        await asyncio.sleep(0)
+        app.release.set()
+        return [(await first)["status"], rejected["status"], (await authorize)["status"]]
+
+    assert asyncio.run(run()) == [200, 429, 200]
+    assert middleware._in_flight["github"] == 0
+
+
+def test_concurrency_slot_is_released_when_the_app_raises():
+    app = FakeApp()
+    app.error = RuntimeError("boom")
+    middleware = limiter(app, provider_concurrency=1)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(request(middleware))
+    assert middleware._in_flight["github"] == 0
+
+    app.error = None
+    assert asyncio.run(request(middleware))["status"] == 200
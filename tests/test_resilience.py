@@ -0,0 +1,226 @@
+"""Circuit breaker transitions, and which provider calls guarded_call retries."""
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi_oauth20.errors import HTTPXOAuth20Error
+from starlette.requests import Request
+
+from clients import resilience
+from clients.registry import PROVIDERS
+from clients.resilience import CircuitBreaker, CircuitOpenError, guarded_call
+from clients.state import STATE_COOKIE, MemoryStateStore, state_binding
+from config import settings
+
+router_module = importlib.import_module("clients.router")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def breaker(clock) -> CircuitBreaker:
+    return CircuitBreaker("github", failure_threshold=3, recovery_timeout=30, clock=clock)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_RETRIES", 2)
+    monkeypatch.setattr(settings, "PROVIDER_RETRY_BACKOFF", 0.0)
+    monkeypatch.setattr(settings, "PROVIDER_DEADLINE", 5.0)
+    monkeypatch.setattr(settings, "PROVIDER_CIRCUIT_FAILURE_THRESHOLD", 100)
+    resilience._breakers.clear()
+    yield
+    resilience._breakers.clear()
+
+
+def test_opens_after_consecutive_failures(breaker):
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert not breaker.available
+
+
+def test_success_resets_the_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 29
+    assert not breaker.available
+    clock.now += 1
+    assert breaker.available
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_probe_success_closes(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    assert breaker.allow()
+
+
+def test_half_open_probe_failure_reopens(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened_at == clock.now
+    assert not breaker.allow()
+
+
+def test_released_probe_can_be_retried(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def failing(error: Exception, calls: list):
+    async def call():
+        calls.append(1)
+        raise error
+
+    return call
+
+
+def connect_error() -> httpx.ConnectError:
+    return httpx.ConnectError("connection refused")
+
+
+def test_non_idempotent_call_is_not_retried():
+    calls = []
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(guarded_call("github", failing(connect_error(), calls)))
+    assert len(calls) == 1
+
+
+def test_idempotent_call_is_retried_on_transient_errors():
+    calls = []
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(guarded_call("github", failing(connect_error(), calls), idempotent=True))
+    assert len(calls) == 1 + settings.PROVIDER_RETRIES
+
+
+def test_idempotent_call_succeeds_after_a_retry():
+    calls = []
+
+    async def call() -> str:
+        calls.append(1)
+        if len(calls) == 1:
+            raise connect_error()
+        return "ok"
+
+    assert asyncio.run(guarded_call("github", call, idempotent=True)) == "ok"
+    assert resilience.get_breaker("github").failures == 0
+
+
+def test_client_errors_are_not_retried_and_keep_the_circuit_closed():
+    calls = []
+    response = httpx.Response(401, request=httpx.Request("GET", "https://api.github.com/user"))
+    error = HTTPXOAuth20Error("401 Unauthorized", response)
+    with pytest.raises(HTTPXOAuth20Error):
+        asyncio.run(guarded_call("github", failing(error, calls), idempotent=True))
+    assert len(calls) == 1
+    assert resilience.get_breaker("github").failures == 0
+
+
+def test_deadline_cuts_off_a_slow_call(monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_DEADLINE", 0.05)
+
+    async def slow() -> None:
+        await asyncio.sleep(10)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(guarded_call("github", slow))
+    assert resilience.get_breaker("github").failures == 1
+
+
+def test_spent_deadline_is_not_a_provider_failure(monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_DEADLINE", 0.0)
+    calls = []
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(guarded_call("github", failing(connect_error(), calls), idempotent=True))
+    assert calls == []
+    assert resilience.get_breaker("github").failures == 0
+
+
+def test_spent_deadline_keeps_the_half_open_probe(monkeypatch, clock):
+    breaker = resilience._breakers["github"] = CircuitBreaker(
+        "github", failure_threshold=1, recovery_timeout=30, clock=clock
+    )
+    breaker.record_failure()
+    clock.now += 30
+    monkeypatch.setattr(settings, "PROVIDER_DEADLINE", 0.0)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(guarded_call("github", failing(connect_error(), [])))
+    # No call was made, so the probe is still free for the next one
+    assert breaker.allow()
+
+
+def test_open_circuit_fails_fast(monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_CIRCUIT_FAILURE_THRESHOLD", 1)
+    calls = []
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(guarded_call("github", failing(connect_error(), calls)))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(guarded_call("github", failing(connect_error(), calls)))
+    assert len(calls) == 1
+    assert not resilience.is_available("github")
+
+
+def test_token_exchange_is_never_retried(monkeypatch):
+    # Authorization codes are single use, a retried exchange would fail anyway or use the code twice
+    exchanges = []
+
+    async def exchange(request, code, state, code_verifier, error):
+        exchanges.append(code)
+        raise connect_error()
+
+    store = MemoryStateStore(ttl=600, max_entries=10)
+    monkeypatch.setattr(router_module, "state_store", store)
+    monkeypatch.setitem(router_module.callback_handlers, "github", exchange)
+
+    async def run() -> None:
+        state = await store.issue("github")
+        cookie = f"{STATE_COOKIE}={state_binding(state)}".encode()
+        headers = [(b"cookie", cookie)]
+        request = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": headers})
+        await router_module.login(request, PROVIDERS["github"], SimpleNamespace(), "code", state, None, None)
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(run())
+    assert exchanges == ["code"]
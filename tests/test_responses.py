@@ -0,0 +1,145 @@
+"""Pre-encoded responses: content negotiation and ETag revalidation."""
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import main
+from responses import PrecompressedBody, brotli, cached_response, make_etag, negotiate_encoding
+
+requires_brotli = pytest.mark.skipif(brotli is None, reason="needs the brotli extra")
+
+BODY = b'{"providers": ["github"], "count": 1}'
+PAGE = b"<html>" + b"login with a provider " * 200 + b"</html>"
+
+
+@pytest.fixture
+def client() -> TestClient:
+    async def providers(request: Request):
+        return cached_response(
+            request, BODY, etag=make_etag(BODY), media_type="application/json", cache_control="public, max-age=60"
+        )
+
+    return TestClient(Starlette(routes=[Route("/", providers)]))
+
+
+def test_response_carries_etag_and_cache_control(client):
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.content == BODY
+    assert response.headers["etag"] == make_etag(BODY)
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+
+def test_matching_etag_is_a_304(client):
+    etag = client.get("/").headers["etag"]
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    # A 304 repeats the validator and caching headers of the 200
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"other", {etag}', ' "other" ,{etag} ', "*"])
+def test_if_none_match_forms(client, if_none_match):
+    etag = client.get("/").headers["etag"]
+    assert client.get("/", headers={"If-None-Match": if_none_match.format(etag=etag)}).status_code == 304
+
+
+@pytest.mark.parametrize("if_none_match", ['"other"', "", make_etag(b"old body")])
+def test_stale_etag_is_a_200(client, if_none_match):
+    response = client.get("/", headers={"If-None-Match": if_none_match})
+    assert response.status_code == 200
+    assert response.content == BODY
+
+
+def test_providers_endpoint_revalidates():
+    client = TestClient(main.app)
+    response = client.get("/api/providers")
+    assert response.status_code == 200
+    response = client.get("/api/providers", headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+@pytest.fixture
+def page_client() -> TestClient:
+    page = PrecompressedBody(PAGE, media_type="text/html; charset=utf-8")
+
+    async def index(request: Request):
+        return page.response(request, cache_control="private, no-cache")
+
+    return TestClient(Starlette(routes=[Route("/", index)]))
+
+
+def get_page(client: TestClient, accept_encoding: str, **headers: str):
+    return client.get("/", headers={"Accept-Encoding": accept_encoding, **headers})
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "coding"),
+    [
+        pytest.param("gzip, deflate, br", "br", marks=requires_brotli),
+        ("gzip", "gzip"),
+        ("br;q=0, gzip", "gzip"),
+        pytest.param("BR;q=0.5", "br", marks=requires_brotli),
+        pytest.param("*", "br", marks=requires_brotli),
+        ("deflate", "identity"),
+        ("gzip;q=0", "identity"),
+        ("gzip;q=oops", "identity"),
+        ("", "identity"),
+    ],
+)
+def test_negotiation(page_client, accept_encoding, coding):
+    response = get_page(page_client, accept_encoding)
+    assert response.status_code == 200
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers.get("content-encoding", "identity") == coding
+    # The client decodes the body again
+    assert response.content == PAGE
+
+
+def test_variants_are_encoded_once():
+    page = PrecompressedBody(PAGE, media_type="text/html")
+    assert gzip.decompress(page.variants["gzip"][0]) == PAGE
+    if brotli is not None:
+        assert brotli.decompress(page.variants["br"][0]) == PAGE
+    # Each encoding is its own representation, with its own ETag
+    assert len({etag for _, etag in page.variants.values()}) == len(page.variants)
+
+
+def test_unknown_codings_are_ignored():
+    request = Request({"type": "http", "headers": [(b"accept-encoding", b"zstd, compress")]})
+    assert negotiate_encoding(request, ("br", "gzip")) == "identity"
+
+
+def test_encoded_304_keeps_vary(page_client):
+    etag = get_page(page_client, "gzip").headers["etag"]
+    response = get_page(page_client, "gzip", **{"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+def test_etag_of_another_encoding_is_not_a_match(page_client):
+    gzip_etag = get_page(page_client, "gzip").headers["etag"]
+    response = get_page(page_client, "identity", **{"If-None-Match": gzip_etag})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+
+def test_anonymous_index_is_encoded_and_revalidates():
+    client = TestClient(main.app)
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    response = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+    assert response.content == b""
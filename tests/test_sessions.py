@@ -0,0 +1,182 @@
+"""Server-side and cookie sessions: session fixation, expiry renewal and the paths that get one."""
+import asyncio
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from main import SESSION_PATHS
+from sessions import (
+    FastJSONSessionMiddleware,
+    MemorySessionStore,
+    PathScopedMiddleware,
+    ServerSessionMiddleware,
+    SQLiteSessionStore,
+)
+
+MAX_AGE = 100
+
+
+async def read(request: Request) -> JSONResponse:
+    return JSONResponse(dict(request.session))
+
+
+async def login(request: Request) -> JSONResponse:
+    request.session["user"] = ["github", "42", None, None, None, None]
+    return JSONResponse({})
+
+
+async def remember(request: Request) -> JSONResponse:
+    request.session["next"] = "/"
+    return JSONResponse({})
+
+
+def session_app(middleware: type, **options):
+    return middleware(Starlette(routes=[Route("/", read), Route("/login", login), Route("/remember", remember)]), max_age=MAX_AGE, **options)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemorySessionStore()
+    else:
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    yield store
+    asyncio.run(store.close())
+
+
+def test_login_replaces_existing_session_id(store):
+    asyncio.run(store.save("planted", {"next": "/"}, MAX_AGE))
+    client = TestClient(session_app(ServerSessionMiddleware, store=store))
+    client.cookies.set("session", "planted")
+
+    response = client.get("/login")
+    session_id = response.cookies["session"]
+    assert session_id != "planted"
+    assert asyncio.run(store.load("planted")) is None
+    data, _ = asyncio.run(store.load(session_id))
+    assert data == {"next": "/", "user": ["github", "42", None, None, None, None]}
+
+
+def test_unknown_session_id_never_creates_a_session(store):
+    client = TestClient(session_app(ServerSessionMiddleware, store=store))
+    client.cookies.set("session", "planted")
+
+    assert client.get("/").json() == {}
+    response = client.get("/remember")
+    assert response.cookies["session"] != "planted"
+    client.cookies.set("session", "planted")
+    response = client.get("/login")
+    assert response.cookies["session"] != "planted"
+    assert asyncio.run(store.load("planted")) is None
+
+
+def test_fresh_session_is_not_rewritten(store):
+    client = TestClient(session_app(ServerSessionMiddleware, store=store))
+    client.get("/login")
+    response = client.get("/")
+    assert response.json() == {"user": ["github", "42", None, None, None, None]}
+    assert "set-cookie" not in response.headers
+
+
+def test_session_past_half_life_is_renewed(store):
+    asyncio.run(store.save("sid", {"user": "octocat"}, MAX_AGE // 4))
+    client = TestClient(session_app(ServerSessionMiddleware, store=store))
+    client.cookies.set("session", "sid")
+
+    response = client.get("/")
+    assert response.json() == {"user": "octocat"}
+    assert f"session=sid; path=/; Max-Age={MAX_AGE}" in response.headers["set-cookie"]
+    _, expires = asyncio.run(store.load("sid"))
+    assert expires > time.time() + MAX_AGE // 2
+
+
+def test_renewal_is_reported(store):
+    renewed = []
+
+    async def on_renew(session: dict, expires: float) -> None:
+        renewed.append((dict(session), expires))
+
+    asyncio.run(store.save("sid", {"grant": "g1"}, MAX_AGE // 4))
+    client = TestClient(session_app(ServerSessionMiddleware, store=store, on_renew=on_renew))
+    client.cookies.set("session", "sid")
+    client.get("/")
+    client.get("/")
+    assert len(renewed) == 1
+    assert renewed[0][0] == {"grant": "g1"}
+    assert renewed[0][1] > time.time() + MAX_AGE // 2
+
+
+def test_cookie_session_past_half_life_is_renewed():
+    app = session_app(FastJSONSessionMiddleware, secret_key="test")
+    client = TestClient(app)
+    client.get("/login")
+    assert "set-cookie" not in client.get("/").headers
+
+    # Sign the cookie as if the login happened three quarters of max_age ago
+    app.signer.get_timestamp = lambda: int(time.time()) - MAX_AGE * 3 // 4
+    client = TestClient(app)
+    client.get("/login")
+    del app.signer.get_timestamp
+    response = client.get("/")
+    assert response.json()["user"][1] == "42"
+    assert f"Max-Age={MAX_AGE}" in response.headers["set-cookie"]
+
+
+async def touch(request: Request) -> JSONResponse:
+    """Writes the session when the route has one, so a scoped route always sets the cookie."""
+    if "session" not in request.scope:
+        return JSONResponse({"session": False})
+    request.session["seen"] = True
+    return JSONResponse({"session": True})
+
+
+@pytest.fixture(params=["server", "cookie"])
+def scoped_client(request) -> TestClient:
+    app = Starlette(routes=[Route("/{path:path}", touch)])
+    if request.param == "server":
+        options = dict(middleware=ServerSessionMiddleware, store=MemorySessionStore())
+    else:
+        options = dict(middleware=FastJSONSessionMiddleware, secret_key="test")
+    return TestClient(PathScopedMiddleware(app, paths=SESSION_PATHS, max_age=MAX_AGE, **options))
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/",
+        "/logout",
+        "/api/user",
+        "/api/v1/oauth2/github/callback",
+        "/api/v1/oauth2/linux-do/callback",
+        "/api/v1/oauth2/wechat_open/callback",
+    ],
+)
+def test_session_routes_get_a_session(scoped_client, path):
+    response = scoped_client.get(path)
+    assert response.json() == {"session": True}
+    assert "session" in response.cookies
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/api/v1/oauth2/github/authorize",
+        "/api/v1/oauth2/linux-do/authorize",
+        "/api/v1/oauth2/github/callback/extra",
+        "/api/providers",
+        "/static/app.css",
+        "/metrics",
+        "/healthz",
+        "/logout/extra",
+    ],
+)
+def test_other_routes_get_no_session(scoped_client, path):
+    scoped_client.cookies.set("session", "existing")
+    response = scoped_client.get(path)
+    assert response.json() == {"session": False}
+    assert "set-cookie" not in response.headers
@@ -0,0 +1,250 @@
+"""OAuth state: single use, expiry, and callbacks that must not share a login across states."""
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from starlette.requests import Request
+
+from clients.authorize import AuthorizeURL
+from clients.registry import PROVIDERS
+from clients.state import STATE_COOKIE, InvalidStateError, MemoryStateStore, SQLiteStateStore
+from sessions import MemorySessionStore, ServerSessionMiddleware
+
+router_module = importlib.import_module("clients.router")
+
+USER_INFO = {"id": 42, "login": "octocat"}
+
+
+def create_store(backend: str, path, ttl: float = 600):
+    if backend == "memory":
+        return MemoryStateStore(ttl=ttl, max_entries=100)
+    return SQLiteStateStore(str(path / "oauth_state.db"), ttl=ttl)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request) -> str:
+    return request.param
+
+
+def test_state_is_consumed_once(backend, tmp_path):
+    store = create_store(backend, tmp_path)
+
+    async def run() -> list:
+        state = await store.issue("github", {"code_verifier": "verifier"})
+        return [await store.consume(state, "github"), await store.consume(state, "github")]
+
+    assert asyncio.run(run()) == [{"code_verifier": "verifier"}, None]
+
+
+def test_state_is_bound_to_its_provider(backend, tmp_path):
+    store = create_store(backend, tmp_path)
+
+    async def run() -> list:
+        state = await store.issue("github")
+        return [await store.consume(state, "google"), await store.consume(state, "github")]
+
+    assert asyncio.run(run()) == [None, None]
+
+
+def test_expired_state_is_rejected(backend, tmp_path):
+    store = create_store(backend, tmp_path, ttl=-1)
+
+    async def run():
+        return await store.consume(await store.issue("github"), "github")
+
+    assert asyncio.run(run()) is None
+
+
+def test_unknown_state_is_rejected(backend, tmp_path):
+    assert asyncio.run(create_store(backend, tmp_path).consume("forged", "github")) is None
+
+
+def test_concurrent_consumers_across_workers(tmp_path):
+    # Two stores on one file stand in for two worker processes
+    stores = [create_store("sqlite", tmp_path), create_store("sqlite", tmp_path)]
+
+    async def run() -> list:
+        state = await stores[0].issue("github")
+        return await asyncio.gather(*(stores[i % 2].consume(state, "github") for i in range(10)))
+
+    assert sum(result is not None for result in asyncio.run(run())) == 1
+
+
+def test_memory_store_is_capped():
+    store = MemoryStateStore(ttl=600, max_entries=3)
+
+    async def run() -> None:
+        for _ in range(10):
+            await store.issue("github")
+
+    asyncio.run(run())
+    assert len(store) <= 3
+
+
+@pytest.fixture
+def callback_app(monkeypatch, backend, tmp_path):
+    """The OAuth routes with a fake GitHub client whose token exchange takes a moment."""
+    store = create_store(backend, tmp_path)
+    exchanges = []
+
+    async def exchange(request, code, state, code_verifier, error):
+        exchanges.append(state)
+        await asyncio.sleep(0.05)
+        return {"access_token": f"token-{code}"}, state
+
+    async def fetch_userinfo(spec, client, token_data):
+        return USER_INFO
+
+    async def save_grant(provider, client, token_data):
+        return None
+
+    async def get_authorize_url(name, client):
+        return AuthorizeURL(head="https://github.example/login/oauth/authorize?state=", tail="", pkce=False)
+
+    monkeypatch.setattr(router_module, "state_store", store)
+    monkeypatch.setattr(router_module, "fetch_userinfo", fetch_userinfo)
+    monkeypatch.setattr(router_module, "save_grant", save_grant)
+    monkeypatch.setattr(router_module, "get_authorize_url", get_authorize_url)
+    monkeypatch.setitem(router_module.provider_clients, "github", SimpleNamespace())
+    monkeypatch.setitem(router_module.callback_handlers, "github", exchange)
+
+    app = FastAPI()
+    app.include_router(router_module.router)
+    return SimpleNamespace(
+        app=ServerSessionMiddleware(app, store=MemorySessionStore()),
+        store=store,
+        exchanges=exchanges,
+    )
+
+
+async def authorize(client: httpx.AsyncClient) -> str:
+    """Start a login in this client's browser and return the state sent to the provider."""
+    response = await client.get("/api/v1/oauth2/github/authorize")
+    return response.headers["location"].partition("state=")[2]
+
+
+def callback(client: httpx.AsyncClient, state: str, code: str = "code"):
+    return client.get("/api/v1/oauth2/github/callback", params={"code": code, "state": state})
+
+
+def run_client(app, scenario, browsers: int = 1):
+    """Run a scenario with one client per browser, each with its own cookies."""
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        clients = [httpx.AsyncClient(transport=transport, base_url="http://testserver") for _ in range(browsers)]
+        try:
+            return await scenario(*clients)
+        finally:
+            for client in clients:
+                await client.aclose()
+
+    return asyncio.run(run())
+
+
+def test_authorize_binds_the_state_to_the_browser(callback_app):
+    async def scenario(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get("/api/v1/oauth2/github/authorize")
+
+    response = run_client(callback_app.app, scenario)
+    cookie = response.headers["set-cookie"]
+    assert cookie.startswith(f"{STATE_COOKIE}=")
+    # Only sent to the provider's callback, never to scripts
+    assert "Path=/api/v1/oauth2/github/callback" in cookie
+    assert "HttpOnly" in cookie
+    assert "SameSite=lax" in cookie
+    # The cookie holds an HMAC, not the state itself
+    state = response.headers["location"].partition("state=")[2]
+    assert state not in cookie
+
+
+@pytest.mark.parametrize("route", ["authorize", "callback"])
+def test_unknown_and_unconfigured_providers(callback_app, monkeypatch, route):
+    monkeypatch.delitem(router_module.provider_clients, "google", raising=False)
+
+    async def scenario(client: httpx.AsyncClient) -> list[httpx.Response]:
+        return [await client.get(f"/api/v1/oauth2/{slug}/{route}") for slug in ("nope", "google")]
+
+    unknown, unconfigured = run_client(callback_app.app, scenario)
+    assert unknown.status_code == 404
+    assert unconfigured.headers["location"] == "/?error=provider_not_supported"
+
+
+def test_replayed_state_is_rejected(callback_app):
+    async def scenario(client: httpx.AsyncClient) -> list[str]:
+        state = await authorize(client)
+        first = await callback(client, state)
+        replay = await callback(client, state, code="other-code")
+        return [first.headers["location"], replay.headers["location"]]
+
+    assert run_client(callback_app.app, scenario) == ["/", "/?error=invalid_state"]
+    assert len(callback_app.exchanges) == 1
+
+
+@pytest.mark.parametrize("params", [{"code": "code"}, {"code": "code", "state": "forged"}], ids=["missing", "forged"])
+def test_invalid_state_redirects_to_the_error_page(callback_app, params):
+    async def scenario(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get("/api/v1/oauth2/github/callback", params=params)
+
+    response = run_client(callback_app.app, scenario)
+    assert response.status_code == 307
+    assert response.headers["location"] == "/?error=invalid_state"
+    assert "set-cookie" not in response.headers
+    assert callback_app.exchanges == []
+
+
+def test_invalid_state_is_not_logged(callback_app):
+    spec = PROVIDERS["github"]
+    request = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []})
+    with pytest.raises(InvalidStateError) as excinfo:
+        asyncio.run(router_module.login(request, spec, SimpleNamespace(), "code", "forged", None, None))
+    # The submitted state is a CSRF token and must not end up in the logs
+    assert "forged" not in str(excinfo.value)
+
+
+def test_login_is_not_shared_across_states(callback_app):
+    async def scenario(client: httpx.AsyncClient) -> list[str]:
+        state = await authorize(client)
+        # Same code, one with the issued state and one with a forged one, while the first is in flight
+        responses = await asyncio.gather(callback(client, state), callback(client, "forged"))
+        return [response.headers["location"] for response in responses]
+
+    assert run_client(callback_app.app, scenario) == ["/", "/?error=invalid_state"]
+    assert len(callback_app.exchanges) == 1
+
+
+def test_double_submit_with_the_same_state_is_shared(callback_app):
+    async def scenario(client: httpx.AsyncClient) -> list[str]:
+        state = await authorize(client)
+        responses = await asyncio.gather(callback(client, state), callback(client, state))
+        return [response.headers["location"] for response in responses]
+
+    assert run_client(callback_app.app, scenario) == ["/", "/"]
+    assert len(callback_app.exchanges) == 1
+
+
+def test_callback_from_another_browser_is_rejected(callback_app):
+    async def scenario(attacker: httpx.AsyncClient, victim: httpx.AsyncClient) -> list[str]:
+        # The attacker starts a login, stops before the callback and sends its URL to the victim
+        state = await authorize(attacker)
+        victim_response = await callback(victim, state)
+        # The state wasn't consumed by the rejected callback
+        attacker_response = await callback(attacker, state)
+        return [victim_response.headers["location"], attacker_response.headers["location"]]
+
+    assert run_client(callback_app.app, scenario, browsers=2) == ["/?error=invalid_state", "/"]
+    assert len(callback_app.exchanges) == 1
+
+
+def test_callback_from_another_browser_does_not_join_a_login(callback_app):
+    async def scenario(attacker: httpx.AsyncClient, victim: httpx.AsyncClient) -> list[str]:
+        state = await authorize(attacker)
+        # The victim's callback arrives while the attacker's own one, with the same code and state, is in flight
+        responses = await asyncio.gather(callback(attacker, state), callback(victim, state))
+        return [response.headers["location"] for response in responses]
+
+    assert run_client(callback_app.app, scenario, browsers=2) == ["/", "/?error=invalid_state"]
+    assert len(callback_app.exchanges) == 1
@@ -0,0 +1,86 @@
+"""Token grants: which ones are revoked when they are replaced, evicted or their session ends."""
+import asyncio
+import time
+
+import pytest
+
+from clients import tokens
+from clients.tokens import MemoryTokenStore, SQLiteTokenStore, TokenGrant
+
+
+def grant(session_left: float, refresh_token: str | None = None) -> TokenGrant:
+    now = time.time()
+    return TokenGrant(
+        provider="google",
+        access_token="access",
+        refresh_token=refresh_token,
+        expires_at=now + 3600,
+        session_expires_at=now + session_left,
+    )
+
+
+@pytest.fixture
+def revoked(monkeypatch) -> list[TokenGrant]:
+    revoked = []
+    monkeypatch.setattr(tokens, "enqueue_revocation", revoked.append)
+    return revoked
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, monkeypatch, tmp_path):
+    if request.param == "memory":
+        store = MemoryTokenStore(max_entries=100)
+    else:
+        store = SQLiteTokenStore(str(tmp_path / "tokens.db"))
+    monkeypatch.setattr(tokens, "token_store", store)
+    yield store
+    asyncio.run(store.close())
+
+
+def test_replaced_grant_is_revoked(store, revoked):
+    asyncio.run(store.save("old", grant(3600)))
+    asyncio.run(tokens.replace_grant("old"))
+    assert asyncio.run(store.get("old")) is None
+    assert [g.access_token for g in revoked] == ["access"]
+
+
+def test_grant_of_ended_session_is_revoked(store, revoked):
+    asyncio.run(store.save("ended", grant(-1, refresh_token="refresh")))
+    asyncio.run(tokens._refresh("ended", asyncio.run(store.get("ended"))))
+    assert asyncio.run(store.get("ended")) is None
+    assert len(revoked) == 1
+
+
+def test_grant_of_renewed_session_is_kept(store, revoked):
+    asyncio.run(store.save("renewed", grant(-1)))
+    leased = asyncio.run(store.get("renewed"))
+    # The session is renewed between the lease and the refresh
+    asyncio.run(tokens.extend_session_grant({"grant": "renewed"}, time.time() + 3600))
+    asyncio.run(tokens._refresh("renewed", leased))
+
+    kept = asyncio.run(store.get("renewed"))
+    assert kept is not None
+    assert kept.session_expires_at > time.time() + 3000
+    assert revoked == []
+
+
+def test_extend_moves_the_grant_due_time(store):
+    asyncio.run(store.save("grant", grant(10)))
+    asyncio.run(store.extend("grant", time.time() + 3600))
+    assert asyncio.run(store.lease_due("google", time.time() + 60, lease=60, limit=10)) == []
+    leased = asyncio.run(store.lease_due("google", time.time() + 4000, lease=60, limit=10))
+    assert [grant_id for grant_id, _ in leased] == ["grant"]
+
+
+def test_eviction_revokes_only_ended_sessions(revoked):
+    store = MemoryTokenStore(max_entries=2)
+    asyncio.run(store.save("active", grant(3600)))
+    asyncio.run(store.save("ended", grant(-1)))
+    asyncio.run(store.save("new", grant(3600)))
+    assert set(store._grants) == {"active", "new"}
+    assert len(revoked) == 1
+
+    # No ended session left: the oldest grant is dropped, but its tokens are still in use
+    asyncio.run(store.save("newer", grant(3600)))
+    assert set(store._grants) == {"new", "newer"}
+    assert len(revoked) == 1
@@ -0,0 +1,83 @@
+"""GitHub's /user/emails fallback, run alongside /user."""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from clients import resilience, userinfo
+from clients.registry import PROVIDERS
+from metrics import OAUTH_PHASE_ERRORS
+
+USER_URL = "https://api.github.com/user"
+CLIENT = SimpleNamespace(userinfo_endpoint=USER_URL)
+EMAILS = [{"email": "other@example.com", "primary": False}, {"email": "private@example.com", "primary": True}]
+
+
+class FakeGitHub:
+    """Answers /user and /user/emails, the emails request after ``emails_delay`` or with ``emails_error``."""
+
+    def __init__(self, email: str | None, emails_delay: float = 0.0, emails_error: Exception | None = None):
+        self.email = email
+        self.emails_delay = emails_delay
+        self.emails_error = emails_error
+        self.requests: list[str] = []
+        self.emails_cancelled = False
+
+    async def get_json(self, provider: str, client, url: str, access_token: str):
+        self.requests.append(url)
+        if url == USER_URL:
+            await asyncio.sleep(0.01)
+            return {"id": 1, "login": "octocat", "email": self.email}
+        try:
+            await asyncio.sleep(self.emails_delay)
+        except asyncio.CancelledError:
+            self.emails_cancelled = True
+            raise
+        if self.emails_error is not None:
+            raise self.emails_error
+        return EMAILS
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    resilience._breakers.clear()
+    yield
+    resilience._breakers.clear()
+
+
+def request_userinfo(monkeypatch, github: FakeGitHub) -> dict:
+    monkeypatch.setattr(userinfo, "_get_json", github.get_json)
+    return asyncio.run(userinfo.request_userinfo(PROVIDERS["github"], CLIENT, {"access_token": "token"}))
+
+
+def emails_errors() -> float:
+    return OAUTH_PHASE_ERRORS.labels("github", "enrich_emails").value
+
+
+def test_private_email_comes_from_the_emails_fallback(monkeypatch):
+    github = FakeGitHub(email=None)
+    assert request_userinfo(monkeypatch, github)["email"] == "private@example.com"
+    # Started together with /user, not after it
+    assert github.requests == [USER_URL, f"{USER_URL}/emails"]
+
+
+def test_fallback_is_cancelled_when_user_has_an_email(monkeypatch):
+    errors = emails_errors()
+    github = FakeGitHub(email="public@example.com", emails_delay=10)
+    assert request_userinfo(monkeypatch, github)["email"] == "public@example.com"
+    assert github.emails_cancelled
+    # A fallback that wasn't needed is no provider error
+    assert emails_errors() == errors
+
+
+def test_failed_fallback_does_not_fail_a_login_with_an_email(monkeypatch):
+    github = FakeGitHub(email="public@example.com", emails_error=httpx.ConnectError("connection reset"))
+    assert request_userinfo(monkeypatch, github)["email"] == "public@example.com"
+
+
+def test_failed_fallback_leaves_the_email_out(monkeypatch):
+    github = FakeGitHub(email=None, emails_error=httpx.ConnectError("connection reset"))
+    user_info = request_userinfo(monkeypatch, github)
+    assert user_info["login"] == "octocat"
+    assert user_info["email"] is None